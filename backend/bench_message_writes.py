@@ -0,0 +1,112 @@
+"""
+Benchmark des insertions de messages : commit par ligne vs write-behind groupé
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlmodel import SQLModel
+
+from database import engine, AsyncSessionLocal, ensure_schema_upgrades, ensure_message_partitions
+from schemas import ConversationCreate
+from services.history_service import HistoryService
+from services.message_write_buffer import MessageWriteBuffer
+import services.history_service as history_module
+
+# Fix for asyncpg on Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_writers(conversation_ids, messages_per_writer):
+    latencies = []
+
+    async def writer(conversation_id):
+        async with AsyncSessionLocal() as session:
+            history_service = HistoryService(session)
+            for i in range(messages_per_writer):
+                start = time.perf_counter()
+                await history_service.add_message(conversation_id, "user", f"Message de test {i}")
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(conversation_id) for conversation_id in conversation_ids))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def report(label, elapsed, latencies):
+    print(f"\n{label}")
+    print(f"  Débit      : {len(latencies) / elapsed:8.1f} messages/s")
+    print(f"  Latence p50: {percentile(latencies, 50):8.2f} ms")
+    print(f"  Latence p95: {percentile(latencies, 95):8.2f} ms")
+    print(f"  Latence p99: {percentile(latencies, 99):8.2f} ms")
+
+
+async def main(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await ensure_schema_upgrades(conn)
+        await ensure_message_partitions(conn)
+
+    async with AsyncSessionLocal() as session:
+        history_service = HistoryService(session)
+        conversation_ids = []
+        for i in range(args.writers):
+            conversation = await history_service.create_conversation(
+                ConversationCreate(title=f"Benchmark {i}")
+            )
+            conversation_ids.append(conversation.id)
+
+    print("=" * 60)
+    print("BENCHMARK INSERTIONS DE MESSAGES")
+    print("=" * 60)
+    print(f"Écrivains concurrents : {args.writers}")
+    print(f"Messages par écrivain : {args.messages}")
+
+    try:
+        elapsed, latencies = await run_writers(conversation_ids, args.messages)
+        report("Commit par message", elapsed, latencies)
+
+        for interval_ms in args.intervals:
+            buffer = MessageWriteBuffer(session_factory=AsyncSessionLocal)
+            buffer.enabled = True
+            buffer.flush_interval_ms = interval_ms
+            buffer.max_rows = args.max_rows
+            history_module.message_write_buffer = buffer
+            await buffer.start()
+            try:
+                elapsed, latencies = await run_writers(conversation_ids, args.messages)
+            finally:
+                await buffer.stop()
+                history_module.message_write_buffer = MessageWriteBuffer()
+            report(
+                f"Write-behind ({interval_ms} ms, {args.max_rows} lignes max) - "
+                f"{buffer.flushes} commits, {buffer.rows_written / max(buffer.flushes, 1):.1f} lignes/commit",
+                elapsed,
+                latencies
+            )
+    finally:
+        async with AsyncSessionLocal() as session:
+            history_service = HistoryService(session)
+            for conversation_id in conversation_ids:
+                await history_service.delete_conversation(conversation_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=50, help="Conversations écrites en parallèle")
+    parser.add_argument("--messages", type=int, default=20, help="Messages par conversation")
+    parser.add_argument("--max-rows", type=int, default=64, help="Taille max d'un lot")
+    parser.add_argument(
+        "--intervals", type=float, nargs="+", default=[1, 5, 20],
+        help="Intervalles de flush à tester (ms)"
+    )
+    asyncio.run(main(parser.parse_args()))
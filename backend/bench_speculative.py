@@ -0,0 +1,81 @@
+"""
+Benchmark du décodage spéculatif : tokens/s avec et sans modèle brouillon
+"""
+import argparse
+import sys
+import time
+
+from services.chat_service import chat_service, SYSTEM_PROMPT
+
+PROMPTS = [
+    "Bonjour, comment vas-tu ?",
+    "Peux-tu m'expliquer simplement ce qu'est une base de données ?",
+    "Donne-moi trois idées de repas rapides pour ce soir.",
+    "Quelle est la différence entre un processus et un thread ?",
+]
+
+
+def run(messages_list, max_new_tokens, draft_model=None):
+    tokenizer = chat_service.tokenizer
+    responses, tokens = [], 0
+    start = time.perf_counter()
+    for messages in messages_list:
+        response = chat_service._generate_with_sync(
+            chat_service.model, tokenizer, messages,
+            max_new_tokens=max_new_tokens, draft_model=draft_model
+        )
+        responses.append(response)
+        tokens += len(tokenizer(response, add_special_tokens=False).input_ids)
+    return responses, tokens, time.perf_counter() - start
+
+
+def main(args):
+    chat_service.draft_model_path = args.draft
+    chat_service.draft_length = args.draft_length
+    chat_service._load_model_sync()
+    if chat_service.model is None or chat_service.draft_model is None:
+        print("✗ Modèle principal ou brouillon non chargé")
+        sys.exit(1)
+
+    messages_list = [
+        [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+        for prompt in PROMPTS
+    ]
+
+    print("=" * 60)
+    print("BENCHMARK DÉCODAGE SPÉCULATIF")
+    print("=" * 60)
+    print(f"Modèle principal : {chat_service.model_path}")
+    print(f"Modèle brouillon : {args.draft} ({args.draft_length} tokens proposés)")
+
+    # Préchauffage des deux chemins
+    run(messages_list[:1], 4)
+    run(messages_list[:1], 4, chat_service.draft_model)
+    for key in chat_service.speculative_totals:
+        chat_service.speculative_totals[key] = 0
+
+    baseline, baseline_tokens, baseline_time = run(messages_list, args.max_new_tokens)
+    speculative, speculative_tokens, speculative_time = run(
+        messages_list, args.max_new_tokens, chat_service.draft_model
+    )
+
+    stats = chat_service.speculative_stats()
+    print(f"\nStandard    : {baseline_tokens / baseline_time:6.1f} tokens/s ({baseline_time:.1f} s)")
+    print(f"Spéculatif  : {speculative_tokens / speculative_time:6.1f} tokens/s ({speculative_time:.1f} s)")
+    print(f"Accélération: x{baseline_time / speculative_time:.2f}")
+    print(f"\nTokens par passe du modèle principal : {stats['tokens_per_pass']:.2f}")
+    print(f"Taux d'acceptation du brouillon      : {stats['acceptance_rate']:.0%}")
+
+    identical = sum(a == b for a, b in zip(baseline, speculative))
+    print(f"\nSorties identiques : {identical}/{len(PROMPTS)}")
+    for prompt, a, b in zip(PROMPTS, baseline, speculative):
+        if a != b:
+            print(f"  ≠ {prompt}\n    standard  : {a!r}\n    spéculatif: {b!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--draft", default="./models/qwen2.5-0.5b-instruct", help="Chemin du modèle brouillon")
+    parser.add_argument("--draft-length", type=int, default=4, help="Tokens proposés par pas")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    main(parser.parse_args())
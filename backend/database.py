@@ -1,10 +1,11 @@
 import os
+from datetime import datetime
 from pathlib import Path
 from typing import AsyncGenerator
 
 import psycopg2
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
@@ -95,6 +96,54 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 # Alias pour la compatibilité avec l'ancien code
 get_session = get_db
 
+def _add_months(date: datetime, months: int) -> datetime:
+    year, month = divmod(date.month - 1 + months, 12)
+    return date.replace(year=date.year + year, month=month + 1)
+
+async def ensure_schema_upgrades(conn) -> None:
+    """Ajoute les colonnes/index que create_all n'ajoute pas aux tables existantes."""
+    await conn.execute(text(
+        "ALTER TABLE conversation ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversation_created_at ON conversation (created_at)"
+    ))
+
+async def is_message_partitioned(conn) -> bool:
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('message')"
+    ))
+    return result.first() is not None
+
+async def ensure_message_partitions(conn, start: datetime = None, months_ahead: int = 2) -> None:
+    """Crée les partitions mensuelles de la table message, de `start` au mois courant + `months_ahead`.
+
+    Les index déclarés sur la table parente sont créés automatiquement sur chaque partition.
+    """
+    if not await is_message_partitioned(conn):
+        print("La table 'message' n'est pas partitionnée : lancer migrate_message_partitions.py")
+        return
+
+    now = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = (start or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _add_months(now, months_ahead)
+    while month <= last:
+        upper = _add_months(month, 1)
+        name = f"message_y{month.year}m{month.month:02d}"
+        try:
+            # Savepoint : un échec ne doit pas annuler la transaction englobante
+            async with conn.begin_nested():
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF message "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+                ))
+        except Exception as e:
+            print(f"Erreur création partition {name}: {e}")
+        month = upper
+
+    # Filet de sécurité pour les timestamps hors des partitions créées
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS message_default PARTITION OF message DEFAULT"))
+
 def get_db_connection():
     """Retourne une connexion synchrone à la base de données PostgreSQL."""
     return psycopg2.connect(
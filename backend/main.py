@@ -1,10 +1,16 @@
+import os
 import sys
 import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel
-from routers import chat
-from database import engine
+from routers import chat, admin
+from database import engine, ensure_schema_upgrades, ensure_message_partitions
+from services.memory_service import memory_service
+from services.message_write_buffer import message_write_buffer
+from services.archive_service import archive_service
+from services.suggestion_service import suggestion_service
+from middleware.traffic_capture import TrafficCaptureMiddleware
 
 # Fix for asyncpg on Windows
 if sys.platform == "win32":
@@ -20,12 +26,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Capture du trafic (TRAFFIC_CAPTURE_FILE) ou simple en-tête Server-Timing (TRAFFIC_TIMING_HEADERS=1)
+if os.getenv("TRAFFIC_CAPTURE_FILE") or os.getenv("TRAFFIC_TIMING_HEADERS") == "1":
+    app.add_middleware(
+        TrafficCaptureMiddleware,
+        capture_file=os.getenv("TRAFFIC_CAPTURE_FILE") or None,
+        redact=os.getenv("TRAFFIC_CAPTURE_REDACT", "1") == "1",
+        pool=engine.pool
+    )
+
 app.include_router(chat.router)
+app.include_router(admin.router)
 
 @app.on_event("startup")
 async def on_startup():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        await ensure_schema_upgrades(conn)
+        await ensure_message_partitions(conn)
+    await message_write_buffer.start()
+    await memory_service.start()
+    await archive_service.start()
+    await suggestion_service.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await suggestion_service.stop()
+    await archive_service.stop()
+    await message_write_buffer.stop()
+    await memory_service.stop()
 
 @app.get("/")
 async def root():
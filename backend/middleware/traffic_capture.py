@@ -0,0 +1,163 @@
+from typing import Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+import re
+import json
+import time
+import hashlib
+
+# Temps passé dans le backend LLM pour la requête courante (rempli par llm_timer)
+_llm_timing: ContextVar[Optional[dict]] = ContextVar("llm_timing", default=None)
+
+# Appels LLM en cours, toutes requêtes confondues (id du dict de timing -> timing)
+_active_llm_calls: Dict[int, dict] = {}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens (mots + ponctuation)."""
+    return len(_TOKEN_PATTERN.findall(text or ""))
+
+
+@contextmanager
+def llm_timer(prompt_tokens: int = 0):
+    """Mesure la durée d'un appel LLM (et la taille de son contexte) pour la requête en cours.
+
+    Compte aussi les autres appels LLM qui se recouvrent avec celui-ci
+    (commencés avant ou pendant) : seul un appel isolé mesure le temps de
+    service du backend sans sa file d'attente.
+    """
+    timing = _llm_timing.get()
+    if timing is not None:
+        timing["prompt_tokens"] += prompt_tokens
+        for other in _active_llm_calls.values():
+            other["llm_overlap"] += 1
+        timing["llm_overlap"] += len(_active_llm_calls)
+        _active_llm_calls[id(timing)] = timing
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing["llm_ms"] += (time.perf_counter() - start) * 1000
+            _active_llm_calls.pop(id(timing), None)
+
+
+def record_llm_wait(wait_ms: float):
+    """Temps passé en file d'attente avant d'accéder au backend LLM."""
+    timing = _llm_timing.get()
+    if timing is not None:
+        timing["wait_ms"] += wait_ms
+
+
+class TrafficCaptureMiddleware(BaseHTTPMiddleware):
+    """Capture du trafic pour la planification de capacité.
+
+    Chaque requête est ajoutée à un journal JSONL (une ligne compacte par
+    requête) : instant, route, conversation, statut, durée, temps LLM,
+    taille du contexte envoyé au LLM, nombre d'appels LLM simultanés,
+    connexions DB utilisées et longueurs en tokens du prompt et de la
+    réponse. Le contenu n'est conservé que si `redact` est faux. Les
+    durées sont aussi renvoyées dans l'en-tête `Server-Timing`, utilisé
+    par replay_traffic.py.
+    """
+
+    def __init__(self, app, capture_file: Optional[str] = None, redact: bool = True, pool=None):
+        super().__init__(app)
+        self.capture_file = capture_file
+        self.redact = redact
+        self.pool = pool
+        self.log = open(capture_file, "a", encoding="utf-8", buffering=1) if capture_file else None
+
+    async def dispatch(self, request: Request, call_next):
+        timing = {"llm_ms": 0.0, "wait_ms": 0.0, "prompt_tokens": 0, "llm_overlap": 0}
+        _llm_timing.set(timing)
+        pool_in_use = self.pool.checkedout() if self.pool is not None else None
+
+        body = await request.body()
+        start_wall = time.time()
+        start = time.perf_counter()
+        response = await call_next(request)
+        response_body = b"".join([chunk async for chunk in response.body_iterator])
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        # Copie modifiable qui conserve les en-têtes répétés (set-cookie...)
+        headers = response.headers.mutablecopy()
+        del headers["content-length"]
+        headers["Server-Timing"] = (
+            f"app;dur={duration_ms:.1f}, llm;dur={timing['llm_ms']:.1f}, llm_wait;dur={timing['wait_ms']:.1f}"
+        )
+        if pool_in_use is not None:
+            headers["X-DB-Pool-In-Use"] = str(pool_in_use)
+
+        if self.log is not None:
+            try:
+                self._write_record(request, body, response, response_body, start_wall, duration_ms, timing, pool_in_use)
+            except Exception as e:
+                print(f"Erreur capture trafic: {e}")
+
+        captured = Response(content=response_body, status_code=response.status_code)
+        captured.raw_headers = headers.raw + [(b"content-length", str(len(response_body)).encode("latin-1"))]
+        return captured
+
+    def _write_record(self, request, body, response, response_body, start_wall, duration_ms, timing, pool_in_use):
+        route = request.scope.get("route")
+        path_params = request.scope.get("path_params", {})
+        record = {
+            "t": round(start_wall, 4),
+            "m": request.method,
+            "p": route.path if route is not None else request.url.path,
+            "c": _conversation_id(path_params.get("conversation_id")),
+            "s": response.status_code,
+            "d": round(duration_ms, 1),
+            "l": round(timing["llm_ms"], 1),
+            "w": round(timing["wait_ms"], 1),
+            "ht": timing["prompt_tokens"],
+            "o": timing["llm_overlap"],
+            "q": pool_in_use
+        }
+        if request.query_params:
+            record["qs"] = {
+                key: ("" if self.redact and key == "title" else value)
+                for key, value in request.query_params.items()
+            }
+
+        request_data = _parse_json(body)
+        response_data = _parse_json(response_body)
+
+        prompt = request_data.get("content") if isinstance(request_data, dict) else None
+        if prompt is not None:
+            record["pt"] = estimate_tokens(prompt)
+            if self.redact:
+                record["ph"] = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+            else:
+                record["x"] = prompt
+        elif isinstance(request_data, dict):
+            record["b"] = {"mode": request_data.get("mode")} if self.redact else request_data
+
+        if isinstance(response_data, dict):
+            if "content" in response_data:
+                record["rt"] = estimate_tokens(response_data["content"])
+            if record["c"] is None and "id" in response_data and "messages" in response_data:
+                # Conversation créée : son id sert à rejouer les requêtes suivantes
+                record["c"] = response_data["id"]
+
+        self.log.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def _conversation_id(value) -> Optional[int]:
+    # Même type (int) que l'id lu dans la réponse à une création
+    return int(value) if value is not None and str(value).isdigit() else None
+
+
+def _parse_json(data: bytes):
+    if not data:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
@@ -0,0 +1,61 @@
+"""
+Migration de la table message existante vers une table partitionnée par mois
+"""
+import asyncio
+import sys
+
+from sqlalchemy import text
+from sqlmodel import SQLModel
+
+from database import engine, ensure_schema_upgrades, ensure_message_partitions, is_message_partitioned
+import models  # noqa: F401  (enregistre les tables dans SQLModel.metadata)
+
+# Fix for asyncpg on Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+async def migrate():
+    print("=" * 60)
+    print("MIGRATION DE LA TABLE MESSAGE (PARTITIONNEMENT MENSUEL)")
+    print("=" * 60)
+
+    async with engine.begin() as conn:
+        exists = (await conn.execute(text("SELECT to_regclass('message')"))).scalar()
+        if exists is None:
+            print("Aucune table 'message' : elle sera créée partitionnée au démarrage.")
+            return
+        if await is_message_partitioned(conn):
+            print("La table 'message' est déjà partitionnée.")
+            return
+
+        print("1/4 Renommage de l'ancienne table...")
+        await conn.execute(text("ALTER TABLE message RENAME TO message_legacy"))
+        await conn.execute(text("ALTER INDEX IF EXISTS message_pkey RENAME TO message_legacy_pkey"))
+        await conn.execute(text("ALTER SEQUENCE IF EXISTS message_id_seq RENAME TO message_legacy_id_seq"))
+
+        print("2/4 Création de la table partitionnée...")
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await ensure_schema_upgrades(conn)
+        oldest = (await conn.execute(text("SELECT min(timestamp) FROM message_legacy"))).scalar()
+        await ensure_message_partitions(conn, start=oldest)
+
+        print("3/4 Copie des messages...")
+        result = await conn.execute(text(
+            "INSERT INTO message (id, conversation_id, sender, content, timestamp, suggestions) "
+            "SELECT id, conversation_id, sender, content, timestamp, suggestions FROM message_legacy"
+        ))
+        print(f"    {result.rowcount} messages copiés")
+        await conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('message', 'id'), "
+            "COALESCE((SELECT max(id) FROM message), 0) + 1, false)"
+        ))
+
+        print("4/4 Suppression de l'ancienne table...")
+        await conn.execute(text("DROP TABLE message_legacy"))
+
+    print("\n✓ Migration terminée")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,23 +1,31 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional, Dict
 from datetime import datetime
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlalchemy.dialects.postgresql import JSON
 
 class Conversation(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     mode: str  # "user_initiated" or "ai_initiated"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    archived_at: Optional[datetime] = Field(default=None)  # messages déplacés dans l'archive froide
     
     messages: List["Message"] = Relationship(back_populates="conversation")
 
 class Message(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    # Table partitionnée par mois sur timestamp (voir database.ensure_message_partitions)
+    __table_args__ = (
+        Index("ix_message_conversation_id_timestamp", "conversation_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+    # La clé de partition doit faire partie de la clé primaire
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     conversation_id: int = Field(foreign_key="conversation.id")
     sender: str  # "user" or "ai"
     content: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
     suggestions: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
     
     conversation: Conversation = Relationship(back_populates="messages")
@@ -0,0 +1,233 @@
+"""
+Rejeu déterministe du trafic capturé (TRAFFIC_CAPTURE_FILE) pour la planification de capacité
+
+  1. Ajuster le modèle de latence LLM sur une capture :
+       python replay_traffic.py fit capture.jsonl -o latency_model.json
+  2. Démarrer une instance de test avec le backend simulé :
+       CHAT_BACKEND=stub STUB_LATENCY_MODEL=latency_model.json TRAFFIC_TIMING_HEADERS=1 \\
+         uvicorn main:app --port 8010
+  3. Rejouer à plusieurs vitesses :
+       python replay_traffic.py run capture.jsonl --target http://localhost:8010 --speeds 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+import numpy as np
+
+MESSAGES_ROUTE = "/conversations/{conversation_id}/messages"
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["t"])
+
+
+# ----------------------------------------------------------------------
+# Ajustement du modèle de latence
+# ----------------------------------------------------------------------
+
+def fit_latency_model(records):
+    """Régression linéaire : llm_ms = base + a * tokens_contexte + b * tokens_réponse.
+
+    Seuls les appels sans autre appel LLM simultané (`o` nul) sont
+    retenus : le backend Ollama ne mesure pas l'attente dans sa propre
+    file, qui gonflerait sinon le temps de service, alors que le backend
+    simulé ajoute déjà la sienne au rejeu. L'attente enregistrée (`w`,
+    backend simulé) est en plus retirée.
+    """
+    samples = [
+        record for record in records
+        if record["p"] == MESSAGES_ROUTE and record["s"] == 200 and record.get("l") and not record.get("o")
+    ]
+    if len(samples) < 3:
+        raise ValueError(f"Pas assez d'appels LLM isolés dans la capture ({len(samples)})")
+
+    y = np.array([record["l"] - record.get("w", 0) for record in samples])
+    X = np.array([[1.0, record.get("ht", 0), record.get("rt", 0)] for record in samples])
+    coefficients, *_ = np.linalg.lstsq(X, y, rcond=None)
+    residuals = y - X @ coefficients
+
+    return {
+        "base_ms": float(max(coefficients[0], 0)),
+        "prompt_token_ms": float(max(coefficients[1], 0)),
+        "response_token_ms": float(max(coefficients[2], 0)),
+        "noise_ms": float(residuals.std()),
+        "response_tokens": [record.get("rt", 0) for record in samples][-1000:],
+        "samples": len(samples)
+    }
+
+
+def fit_command(args):
+    model = fit_latency_model(load_records(args.capture))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=2)
+    print(f"Modèle de latence ({model['samples']} appels LLM) :")
+    print(f"  base              : {model['base_ms']:.1f} ms")
+    print(f"  par token contexte: {model['prompt_token_ms']:.3f} ms")
+    print(f"  par token réponse : {model['response_token_ms']:.2f} ms")
+    print(f"  bruit (écart-type): {model['noise_ms']:.1f} ms")
+    print(f"✓ Écrit dans {args.output}")
+
+
+# ----------------------------------------------------------------------
+# Rejeu
+# ----------------------------------------------------------------------
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration)
+    return timings
+
+
+class Replayer:
+    def __init__(self, client, records, speed):
+        self.client = client
+        self.records = records
+        self.speed = speed
+        # id de conversation capturé -> future de l'id créé sur l'instance de test
+        self.conversations = {}
+        self.results = []
+
+    def conversation_id(self, captured_id, mode="user_initiated"):
+        if captured_id not in self.conversations:
+            # Conversation antérieure à la capture : la créer à la première utilisation
+            self.conversations[captured_id] = asyncio.ensure_future(self._create(mode))
+        return self.conversations[captured_id]
+
+    async def _create(self, mode):
+        response = await self.client.post("/conversations/", json={"mode": mode, "title": "Replay"})
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def issue(self, record):
+        method, route = record["m"], record["p"]
+        body = record.get("b")
+        future = None
+        if method == "POST" and route == "/conversations/" and record.get("c") is not None:
+            future = asyncio.get_event_loop().create_future()
+            self.conversations[record["c"]] = future
+
+        start = time.perf_counter()
+        try:
+            response = await self._send(method, route, record, body)
+            status = response.status_code
+            timings = parse_server_timing(response.headers.get("server-timing"))
+            pool_in_use = response.headers.get("x-db-pool-in-use")
+            if future is not None:
+                if status == 200:
+                    future.set_result(response.json()["id"])
+                else:
+                    future.set_exception(RuntimeError(f"Création conversation: {status}"))
+        except Exception as e:
+            status, timings, pool_in_use = type(e).__name__, {}, None
+            if future is not None and not future.done():
+                future.set_exception(e)
+
+        self.results.append({
+            "route": f"{method} {route}",
+            "status": status,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "app_ms": timings.get("app"),
+            "llm_ms": timings.get("llm"),
+            "wait_ms": timings.get("llm_wait"),
+            "pool_in_use": int(pool_in_use) if pool_in_use is not None else None
+        })
+
+    async def _send(self, method, route, record, body):
+        if method == "POST" and route == "/conversations/":
+            mode = (body or {}).get("mode") or "user_initiated"
+            return await self.client.post("/conversations/", json={"mode": mode, "title": "Replay"})
+
+        path = route
+        if record.get("c") is not None:
+            path = route.replace("{conversation_id}", str(await self.conversation_id(record["c"])))
+        if route == MESSAGES_ROUTE:
+            # Contenu capturé si disponible, sinon texte de même longueur
+            content = record.get("x") or " ".join(["mot"] * max(record.get("pt", 1), 1))
+            return await self.client.post(path, json={"content": content})
+        return await self.client.request(method, path, params=record.get("qs"), json=body)
+
+    async def run(self):
+        t0 = self.records[0]["t"]
+        start = time.perf_counter()
+        tasks = []
+        for record in self.records:
+            delay = (record["t"] - t0) / self.speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self.issue(record)))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return time.perf_counter() - start
+
+
+def summarize(speed, elapsed, results):
+    latencies = np.array([r["latency_ms"] for r in results])
+    errors = sum(1 for r in results if r["status"] != 200)
+    waits = np.array([r["wait_ms"] for r in results if r["llm_ms"] and r["wait_ms"] is not None] or [0.0])
+    db_times = np.array([
+        r["app_ms"] - r["llm_ms"] for r in results
+        if r["app_ms"] is not None and r["llm_ms"] is not None
+    ] or [0.0])
+    pools = [r["pool_in_use"] for r in results if r["pool_in_use"] is not None]
+
+    print(f"\nVitesse x{speed:g} : {len(results)} requêtes en {elapsed:.1f} s ({len(results) / elapsed:.1f} req/s), {errors} erreur(s)")
+    print(f"  Latence       p50 {np.percentile(latencies, 50):8.1f} ms   p95 {np.percentile(latencies, 95):8.1f} ms   p99 {np.percentile(latencies, 99):8.1f} ms")
+    print(f"  Attente LLM   moy {waits.mean():8.1f} ms   p95 {np.percentile(waits, 95):8.1f} ms")
+    print(f"  Hors LLM (DB) moy {db_times.mean():8.1f} ms   p95 {np.percentile(db_times, 95):8.1f} ms")
+    if pools:
+        print(f"  Pool DB       moy {np.mean(pools):8.1f}      max {max(pools):8d} connexions")
+
+    routes = sorted(set(r["route"] for r in results))
+    for route in routes:
+        route_latencies = [r["latency_ms"] for r in results if r["route"] == route]
+        print(f"    {route:45s} n={len(route_latencies):5d}  p95 {np.percentile(route_latencies, 95):8.1f} ms")
+
+
+async def run_command(args):
+    records = load_records(args.capture)
+    if not records:
+        print("✗ Capture vide")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("REJEU DU TRAFIC")
+    print("=" * 60)
+    print(f"Capture : {args.capture} ({len(records)} requêtes, {records[-1]['t'] - records[0]['t']:.0f} s)")
+    print(f"Cible   : {args.target}")
+
+    limits = httpx.Limits(max_connections=args.max_connections)
+    for speed in args.speeds:
+        async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+            replayer = Replayer(client, records, speed)
+            elapsed = await replayer.run()
+        summarize(speed, elapsed, replayer.results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fit_parser = subparsers.add_parser("fit", help="Ajuster le modèle de latence du backend simulé")
+    fit_parser.add_argument("capture")
+    fit_parser.add_argument("-o", "--output", default="latency_model.json")
+
+    run_parser = subparsers.add_parser("run", help="Rejouer la capture contre une instance de test")
+    run_parser.add_argument("capture")
+    run_parser.add_argument("--target", default="http://localhost:8010")
+    run_parser.add_argument("--speeds", type=float, nargs="+", default=[1])
+    run_parser.add_argument("--timeout", type=float, default=300)
+    run_parser.add_argument("--max-connections", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == "fit":
+        fit_command(args)
+    else:
+        asyncio.run(run_command(args))
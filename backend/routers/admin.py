@@ -0,0 +1,30 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+from schemas import ModelSwapRequest, ModelStatusResponse
+from services.chat_backend import chat_service
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    # Sans ADMIN_TOKEN configuré, l'API d'administration est désactivée
+    # (CORS ouvert : une page web pourrait sinon déclencher un changement de modèle)
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="API d'administration désactivée (ADMIN_TOKEN absent)")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+@router.get("/model", response_model=ModelStatusResponse)
+async def get_model_status():
+    return chat_service.swap_status()
+
+@router.post("/model", response_model=ModelStatusResponse, status_code=202)
+async def swap_model(swap_data: ModelSwapRequest):
+    # Chargement + préchauffage en arrière-plan, bascule quand le modèle est prêt
+    try:
+        chat_service.start_swap(swap_data.model)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return chat_service.swap_status()
@@ -4,8 +4,11 @@ from typing import List
 from database import get_db
 from schemas import ConversationCreate, ConversationResponse, MessageCreate, MessageResponse
 from services.history_service import HistoryService
-from services.chat_service_ollama import chat_service
+from services.chat_backend import chat_service
+from services.memory_service import memory_service
+from services.suggestion_service import suggestion_service
 from models import Conversation
+from middleware.traffic_capture import estimate_tokens, llm_timer
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -20,7 +23,8 @@ async def start_conversation(
     # If AI initiated, send a greeting
     if conversation.mode == "ai_initiated":
         greeting = "Bonjour ! Je suis votre assistant IA. Comment puis-je vous aider aujourd'hui ?"
-        await history_service.add_message(conversation.id, "ai", greeting, None)
+        greeting_message = await history_service.add_message(conversation.id, "ai", greeting, None)
+        memory_service.schedule(greeting_message)
     
     # Refresh conversation to include messages
     conversation = await history_service.get_conversation(conversation.id)
@@ -60,15 +64,22 @@ async def send_message(
 
     # 1. Save user message
     user_message = await history_service.add_message(conversation_id, "user", message_data.content)
+    memory_service.schedule(user_message)
 
     # 2. Get history
     history = await history_service.get_messages(conversation_id)
 
     # 3. Generate AI response
-    ai_content, suggestions = await chat_service.generate_response(history)
+    with llm_timer(sum(estimate_tokens(msg.content) for msg in history)):
+        ai_content, suggestions = await chat_service.generate_response(history)
 
     # 4. Save AI message
     ai_message = await history_service.add_message(conversation_id, "ai", ai_content, suggestions)
+    memory_service.schedule(ai_message)
+
+    # 5. Suggestions de suivi générées en arrière-plan, servies au prochain GET
+    if not ai_message.suggestions:
+        suggestion_service.enqueue(ai_message, message_data.content)
 
     return ai_message
 
@@ -83,6 +94,7 @@ async def delete_conversation(
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     await history_service.delete_conversation(conversation_id)
+    await memory_service.forget(conversation_id)
     return {"message": "Conversation supprimée"}
 
 @router.patch("/{conversation_id}")
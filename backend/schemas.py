@@ -28,3 +28,12 @@ class ConversationResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+class ModelSwapRequest(BaseModel):
+    model: str  # nom Ollama (ex: "qwen2.5:3b") ou chemin local du modèle
+
+class ModelStatusResponse(BaseModel):
+    model: str
+    state: str
+    target: Optional[str] = None
+    error: Optional[str] = None
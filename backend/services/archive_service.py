@@ -0,0 +1,174 @@
+from typing import List, Optional
+from pathlib import Path
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Conversation, Message
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ArchiveService:
+    """Archive froide des conversations inactives.
+
+    Les messages des conversations sans activité depuis `idle_days` jours
+    sont écrits dans un fichier Parquet compressé en zstd puis supprimés
+    de la table `message`. La conversation reste en base avec `archived_at`
+    renseigné ; ses messages sont réinsérés dès qu'on y accède.
+    """
+
+    def __init__(self):
+        self.archive_dir = Path(os.getenv("ARCHIVE_DIR", "./archive"))
+        self.idle_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 0 = archivage désactivé
+        self.interval_hours = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "6"))
+        self.batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.worker: Optional[asyncio.Task] = None
+
+    def _path(self, conversation_id: int) -> Path:
+        return self.archive_dir / f"conversation_{conversation_id}.parquet"
+
+    def _write_sync(self, conversation_id: int, rows: List[dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(conversation_id)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(pa.Table.from_pylist(rows), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def _read_sync(self, conversation_id: int) -> List[dict]:
+        import pyarrow.parquet as pq
+
+        return pq.read_table(self._path(conversation_id)).to_pylist()
+
+    def discard(self, conversation_id: int):
+        """Supprime le fichier d'archive d'une conversation (suppression définitive)."""
+        path = self._path(conversation_id)
+        if path.exists():
+            path.unlink()
+
+    async def archive_conversation(self, session: AsyncSession, conversation_id: int, cutoff: datetime) -> bool:
+        # Verrouille la conversation : bloque aussi les insertions de messages (clé étrangère)
+        statement = select(Conversation).where(Conversation.id == conversation_id).with_for_update()
+        conversation = (await session.execute(statement)).scalar_one_or_none()
+        if conversation is None or conversation.archived_at is not None:
+            await session.rollback()
+            return False
+
+        statement = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.timestamp)
+        messages = (await session.execute(statement)).scalars().all()
+        if messages and messages[-1].timestamp >= cutoff:
+            # Activité récente depuis la sélection
+            await session.rollback()
+            return False
+
+        rows = [
+            {
+                "id": msg.id,
+                "conversation_id": msg.conversation_id,
+                "sender": msg.sender,
+                "content": msg.content,
+                "timestamp": msg.timestamp,
+                "suggestions": msg.suggestions
+            }
+            for msg in messages
+        ]
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self._write_sync, conversation_id, rows)
+
+        await session.execute(delete(Message).where(Message.conversation_id == conversation_id))
+        conversation.archived_at = datetime.utcnow()
+        await session.commit()
+        return True
+
+    async def archive_idle(self, session: AsyncSession) -> int:
+        """Archive un lot de conversations inactives, retourne le nombre archivé."""
+        cutoff = datetime.utcnow() - timedelta(days=self.idle_days)
+        # Seules les partitions postérieures au seuil sont lues (index conversation_id, timestamp)
+        recent_activity = (
+            select(Message.id)
+            .where(Message.conversation_id == Conversation.id)
+            .where(Message.timestamp >= cutoff)
+        )
+        statement = (
+            select(Conversation.id)
+            .where(Conversation.archived_at.is_(None))
+            .where(Conversation.created_at < cutoff)
+            .where(~recent_activity.exists())
+            .order_by(Conversation.created_at)
+            .limit(self.batch_size)
+        )
+        conversation_ids = (await session.execute(statement)).scalars().all()
+        await session.commit()
+
+        archived = 0
+        for conversation_id in conversation_ids:
+            try:
+                if await self.archive_conversation(session, conversation_id, cutoff):
+                    archived += 1
+            except Exception as e:
+                await session.rollback()
+                print(f"Erreur archivage conversation {conversation_id}: {e}")
+        return archived
+
+    async def rehydrate(self, session: AsyncSession, conversation_id: int):
+        """Réinsère dans la table chaude les messages d'une conversation archivée."""
+        statement = select(Conversation).where(Conversation.id == conversation_id).with_for_update()
+        conversation = (await session.execute(statement)).scalar_one_or_none()
+        if conversation is None or conversation.archived_at is None:
+            # Déjà réhydratée par une autre requête
+            await session.commit()
+            return
+
+        path = self._path(conversation_id)
+        if path.exists():
+            loop = asyncio.get_event_loop()
+            rows = await loop.run_in_executor(self.executor, self._read_sync, conversation_id)
+            if rows:
+                await session.execute(insert(Message).values(rows))
+        else:
+            print(f"Archive introuvable pour la conversation {conversation_id}: {path}")
+
+        conversation.archived_at = None
+        await session.commit()
+        self.discard(conversation_id)
+
+    async def start(self):
+        if self.worker is None:
+            self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    async def _run(self):
+        from database import AsyncSessionLocal, engine, ensure_message_partitions
+
+        while True:
+            try:
+                # Créer les partitions des mois à venir avant qu'elles ne servent
+                async with engine.begin() as conn:
+                    await ensure_message_partitions(conn)
+
+                if self.idle_days > 0:
+                    # Enchaîner les lots tant qu'ils progressent, pour rattraper un arriéré
+                    total = 0
+                    async with AsyncSessionLocal() as session:
+                        while True:
+                            archived = await self.archive_idle(session)
+                            total += archived
+                            if archived == 0:
+                                break
+                    if total:
+                        print(f"{total} conversation(s) archivée(s)")
+            except Exception as e:
+                print(f"Erreur maintenance archive/partitions: {e}")
+            await asyncio.sleep(self.interval_hours * 3600)
+
+
+archive_service = ArchiveService()
@@ -0,0 +1,11 @@
+import os
+
+# Backend LLM utilisé par l'API : "ollama" (par défaut), "local" (Transformers) ou "stub" (rejeu de trafic)
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "ollama")
+
+if CHAT_BACKEND == "stub":
+    from services.chat_service_stub import chat_service
+elif CHAT_BACKEND == "local":
+    from services.chat_service import chat_service
+else:
+    from services.chat_service_ollama import chat_service
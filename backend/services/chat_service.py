@@ -1,46 +1,109 @@
 from typing import List, Tuple, Optional
 from models import Message
+from services.memory_service import memory_service
+from services.model_warmup import WARMUP_PROMPTS
 import os
+import gc
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
+SYSTEM_PROMPT = """Tu es un assistant IA intelligent, amical et naturel. 
+
+Ton rôle :
+- Réponds de manière conversationnelle et humaine
+- Sois concis mais complet dans tes réponses
+- Adapte ton ton à celui de l'utilisateur (formel/informel)
+- Pose des questions de clarification si nécessaire
+- Donne des exemples concrets quand c'est utile
+- Sois proactif et propose des solutions
+
+Style de communication :
+- Utilise un langage naturel et fluide
+- Évite les formulations robotiques
+- Montre de l'empathie et de la compréhension
+- Sois direct et va à l'essentiel
+
+Réponds toujours en français de manière claire et engageante."""
+
 class ChatService:
     def __init__(self):
         self.model = None
         self.tokenizer = None
         self.model_path = "./models/qwen2.5-1.5b-instruct"
         self.loading = False
+        # Budget du prompt : système, dernier message, tours rappelés puis messages récents
+        self.max_prompt_tokens = int(os.getenv("LOCAL_MAX_PROMPT_TOKENS", "512"))
         self.executor = ThreadPoolExecutor(max_workers=1)
+        # Chargement des nouvelles versions à côté du modèle servi
+        self.loader_executor = ThreadPoolExecutor(max_workers=1)
+        self.swap_lock = threading.Lock()
+        self.swap_task: Optional[asyncio.Task] = None
+        self.swap_target: Optional[str] = None
+        self.swap_state = "idle"  # idle | loading | warming | error
+        self.swap_error: Optional[str] = None
+        # Décodage spéculatif : petit modèle brouillon (même tokenizer), désactivé si vide
+        self.draft_model = None  # brouillon actif, None si incompatible avec le modèle servi
+        self.draft_bundle = None  # (modèle, tokenizer) brouillon chargé
+        self.draft_model_path = os.getenv("SPECULATIVE_DRAFT_MODEL_PATH", "")
+        self.draft_length = int(os.getenv("SPECULATIVE_DRAFT_LENGTH", "4"))
+        self.speculative_totals = {
+            "generations": 0,
+            "new_tokens": 0,
+            "target_passes": 0,
+            "draft_tokens": 0,
+            "accepted_tokens": 0
+        }
+
+    def _load_bundle_sync(self, model_path: str):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
+        print(f"Chargement du modèle depuis {model_path}...")
+        print("Optimisation pour CPU en cours...")
+        
+        print("[1/4] Chargement du tokenizer...")
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        # Si le prompt dépasse encore le budget, couper le début et garder la fin
+        tokenizer.truncation_side = "left"
+        print("[1/4] Tokenizer OK")
+        
+        print("[2/4] Chargement du modèle (peut prendre 2-5 min)...")
+        # safetensors : les poids sont lus en memory-map
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path,
+            low_cpu_mem_usage=True,
+            use_safetensors=True
+        )
+        print("[2/4] Modèle OK")
+        
+        print("[3/4] Mode évaluation...")
+        model.eval()
+        print("[3/4] Mode évaluation OK")
+        
+        print("[4/4] Désactivation des gradients...")
+        for param in model.parameters():
+            param.requires_grad = False
+        print("[4/4] Gradients désactivés")
+        
+        return model, tokenizer
         
     def _load_model_sync(self):
         if self.model is None and not self.loading:
             self.loading = True
             try:
-                from transformers import AutoModelForCausalLM, AutoTokenizer
-                import torch
-                
-                print(f"Chargement du modèle depuis {self.model_path}...")
-                print("Optimisation pour CPU en cours...")
-                
-                print("[1/4] Chargement du tokenizer...")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-                print("[1/4] Tokenizer OK")
-                
-                print("[2/4] Chargement du modèle (peut prendre 2-5 min)...")
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_path,
-                    low_cpu_mem_usage=True
-                )
-                print("[2/4] Modèle OK")
-                
-                print("[3/4] Mode évaluation...")
-                self.model.eval()
-                print("[3/4] Mode évaluation OK")
+                model_path = self.model_path
+                model, tokenizer = self._load_bundle_sync(model_path)
+                with self.swap_lock:
+                    if self.model is not None or self.model_path != model_path:
+                        # Un changement de modèle s'est terminé pendant le chargement : le garder
+                        print(f"Chargement initial de {model_path} ignoré : modèle déjà remplacé")
+                        return
+                    self.model, self.tokenizer = model, tokenizer
                 
-                print("[4/4] Désactivation des gradients...")
-                for param in self.model.parameters():
-                    param.requires_grad = False
-                print("[4/4] Gradients désactivés")
+                if self.draft_model_path:
+                    self._load_draft_sync()
+                    with self.swap_lock:
+                        self.draft_model = self._draft_for_sync(tokenizer)
                 
                 print("\n" + "="*50)
                 print("MODELE CHARGE ET OPTIMISE!")
@@ -50,34 +113,191 @@ class ChatService:
                 self.model = None
             finally:
                 self.loading = False
+
+    def _load_draft_sync(self):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
+        try:
+            print(f"Chargement du modèle brouillon depuis {self.draft_model_path}...")
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_path)
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                self.draft_model_path,
+                low_cpu_mem_usage=True,
+                use_safetensors=True
+            )
+            draft_model.eval()
+            for param in draft_model.parameters():
+                param.requires_grad = False
+            # Nombre fixe de tokens proposés à chaque pas de vérification
+            draft_model.generation_config.num_assistant_tokens = self.draft_length
+            draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+            self.draft_bundle = (draft_model, draft_tokenizer)
+        except Exception as e:
+            print(f"Erreur chargement modèle brouillon, décodage standard: {e}")
+            self.draft_bundle = None
+
+    def _draft_for_sync(self, tokenizer):
+        """Brouillon utilisable avec ce tokenizer, ou None (décodage standard)."""
+        if self.draft_bundle is None:
+            return None
+        draft_model, draft_tokenizer = self.draft_bundle
+        # La génération assistée suppose un vocabulaire identique
+        if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+            print("Tokenizer du brouillon incompatible avec le modèle servi : décodage spéculatif désactivé")
+            return None
+        print(f"Décodage spéculatif activé ({self.draft_length} tokens proposés par pas)")
+        return draft_model
+
+    def speculative_stats(self) -> dict:
+        totals = dict(self.speculative_totals)
+        passes = max(totals["target_passes"], 1)
+        totals["tokens_per_pass"] = totals["new_tokens"] / passes
+        totals["acceptance_rate"] = totals["accepted_tokens"] / max(totals["draft_tokens"], 1)
+        return totals
+
+    def _warmup_sync(self, model, tokenizer):
+        """Prefill + quelques pas de décodage pour chauffer noyaux et caches."""
+        for prompt in WARMUP_PROMPTS:
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+            self._generate_with_sync(model, tokenizer, messages, max_new_tokens=4)
+
+    def swap_status(self) -> dict:
+        return {
+            "model": self.model_path,
+            "state": self.swap_state,
+            "target": self.swap_target,
+            "error": self.swap_error
+        }
+
+    def start_swap(self, model_path: str):
+        """Lance en arrière-plan le remplacement du modèle servi."""
+        if self.swap_task is not None and not self.swap_task.done():
+            raise RuntimeError(f"Changement de modèle déjà en cours vers {self.swap_target}")
+        if self.loading:
+            raise RuntimeError(f"Chargement initial du modèle {self.model_path} en cours")
+        self.swap_target = model_path
+        self.swap_error = None
+        self.swap_task = asyncio.create_task(self.swap_model(model_path))
+
+    async def swap_model(self, model_path: str):
+        loop = asyncio.get_event_loop()
+        try:
+            self.swap_state = "loading"
+            model, tokenizer = await loop.run_in_executor(
+                self.loader_executor, self._load_bundle_sync, model_path
+            )
+            
+            self.swap_state = "warming"
+            await loop.run_in_executor(self.loader_executor, self._warmup_sync, model, tokenizer)
+            draft_model = self._draft_for_sync(tokenizer)
+            
+            # Bascule atomique : les générations en cours gardent leur référence
+            # à l'ancien modèle, libéré quand la dernière se termine
+            with self.swap_lock:
+                old_path = self.model_path
+                self.model, self.tokenizer = model, tokenizer
+                self.draft_model = draft_model
+                self.model_path = model_path
+            del model, tokenizer, draft_model
+            gc.collect()
+            print(f"Modèle remplacé : {old_path} -> {model_path}")
+            
+            self.swap_state = "idle"
+            self.swap_target = None
+        except Exception as e:
+            print(f"Erreur changement de modèle ({model_path}): {e}")
+            self.swap_state = "error"
+            self.swap_error = f"{type(e).__name__}: {e}"
     
-    def _generate_sync(self, messages):
+    def _generate_with_sync(self, model, tokenizer, messages, max_new_tokens=30, draft_model=None):
         import torch
         
-        text = self.tokenizer.apply_chat_template(
+        text = tokenizer.apply_chat_template(
             messages, 
             tokenize=False, 
             add_generation_prompt=True
         )
         
-        inputs = self.tokenizer([text], return_tensors="pt", truncation=True, max_length=128)
+        inputs = tokenizer([text], return_tensors="pt", truncation=True, max_length=self.max_prompt_tokens)
+        
+        generate_kwargs = {}
+        passes = {"target": 0, "draft": 0}
+        hooks = []
+        if draft_model is not None:
+            # Le brouillon propose plusieurs tokens, vérifiés en une passe du modèle principal.
+            # En greedy, la sortie est identique au décodage standard.
+            generate_kwargs["assistant_model"] = draft_model
+            hooks = [
+                model.register_forward_hook(lambda *_: passes.__setitem__("target", passes["target"] + 1)),
+                draft_model.register_forward_hook(lambda *_: passes.__setitem__("draft", passes["draft"] + 1))
+            ]
         
         # Génération ultra-rapide pour CPU
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=30,  # Très court pour rapidité
-                do_sample=False,  # Greedy = plus rapide
-                pad_token_id=self.tokenizer.eos_token_id,
-                use_cache=True
-            )
+        try:
+            with torch.no_grad():
+                outputs = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,  # Très court pour rapidité
+                    do_sample=False,  # Greedy = plus rapide
+                    pad_token_id=tokenizer.eos_token_id,
+                    use_cache=True,
+                    **generate_kwargs
+                )
+        finally:
+            for hook in hooks:
+                hook.remove()
+        
+        if draft_model is not None:
+            # Chaque passe de vérification produit les tokens acceptés + 1 token du modèle principal
+            new_tokens = len(outputs[0]) - len(inputs.input_ids[0])
+            totals = self.speculative_totals
+            totals["generations"] += 1
+            totals["new_tokens"] += new_tokens
+            totals["target_passes"] += passes["target"]
+            totals["draft_tokens"] += passes["draft"]
+            totals["accepted_tokens"] += max(new_tokens - passes["target"], 0)
         
-        response = self.tokenizer.decode(
+        response = tokenizer.decode(
             outputs[0][len(inputs.input_ids[0]):], 
             skip_special_tokens=True
         )
         return response
 
+    def _fit_prompt_sync(self, tokenizer, recalled: List[Message], recent: List[Message]) -> List[dict]:
+        """Messages du prompt, dans l'ordre chronologique, tenant dans max_prompt_tokens.
+
+        Priorité : prompt système, dernier message, tours rappelés par la
+        mémoire, puis messages récents du plus proche au plus ancien.
+        """
+        ordered = list(recalled) + list(recent)
+
+        def as_chat(indexes):
+            messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+            for i in sorted(indexes):
+                role = "user" if ordered[i].sender == "user" else "assistant"
+                messages.append({"role": role, "content": ordered[i].content})
+            return messages
+
+        def size(indexes):
+            return len(tokenizer.apply_chat_template(as_chat(indexes), tokenize=True, add_generation_prompt=True))
+
+        last = len(ordered) - 1
+        kept = [last] if ordered else []
+        for i in list(range(len(recalled))) + list(range(last - 1, len(recalled) - 1, -1)):
+            if size(kept + [i]) <= self.max_prompt_tokens:
+                kept.append(i)
+        return as_chat(kept)
+
+    def _generate_sync(self, recalled: List[Message], recent: List[Message]):
+        # Lecture cohérente du modèle, du tokenizer et du brouillon (voir swap_model)
+        with self.swap_lock:
+            model, tokenizer, draft_model = self.model, self.tokenizer, self.draft_model
+        messages = self._fit_prompt_sync(tokenizer, recalled, recent)
+        return self._generate_with_sync(model, tokenizer, messages, draft_model=draft_model)
+
     async def generate_response(self, history: List[Message]) -> Tuple[str, Optional[List[str]]]:
         try:
             # Charger le modèle si nécessaire
@@ -89,37 +309,15 @@ class ChatService:
             if self.model is None:
                 return "Le modèle est en cours de chargement, veuillez réessayer dans quelques instants.", None
             
-            # Préparer les messages avec prompt système
-            messages = [
-                {
-                    "role": "system",
-                    "content": """Tu es un assistant IA intelligent, amical et naturel. 
-
-Ton rôle :
-- Réponds de manière conversationnelle et humaine
-- Sois concis mais complet dans tes réponses
-- Adapte ton ton à celui de l'utilisateur (formel/informel)
-- Pose des questions de clarification si nécessaire
-- Donne des exemples concrets quand c'est utile
-- Sois proactif et propose des solutions
-
-Style de communication :
-- Utilise un langage naturel et fluide
-- Évite les formulations robotiques
-- Montre de l'empathie et de la compréhension
-- Sois direct et va à l'essentiel
-
-Réponds toujours en français de manière claire et engageante."""
-                }
-            ]
-            
-            for msg in history:
-                role = "user" if msg.sender == "user" else "assistant"
-                messages.append({"role": role, "content": msg.content})
+            # Contexte limité : anciens tours pertinents (mémoire) + 4 derniers messages,
+            # réduit au budget de tokens au moment de la génération
+            selected, _ = await memory_service.build_context(history, head=0, recent=4)
+            recent = list(history[-4:])
+            recalled = selected[:len(selected) - len(recent)]
             
             # Générer la réponse dans un thread séparé
             loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(self.executor, self._generate_sync, messages)
+            response = await loop.run_in_executor(self.executor, self._generate_sync, recalled, recent)
             
             return response, None
             
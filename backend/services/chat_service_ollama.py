@@ -1,50 +1,157 @@
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from models import Message
+from services.memory_service import memory_service
+from services.model_warmup import WARMUP_PROMPTS
+import json
+import asyncio
 import httpx
 
+SYSTEM_PROMPT = "Tu es un assistant IA. Réponds de manière concise et directe en français."
+
+SUGGESTIONS_PROMPT = (
+    "Pour chaque échange numéroté ci-dessous, propose 3 questions de suivi courtes "
+    "(moins de 12 mots) que l'utilisateur pourrait poser ensuite, en français."
+)
+
+# Sortie structurée : une liste de suggestions par id de message
+SUGGESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "suggestions": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["id", "suggestions"]
+            }
+        }
+    },
+    "required": ["items"]
+}
+
 class ChatServiceOllama:
     def __init__(self):
-        self.api_url = "http://localhost:11434/v1/chat/completions"
+        self.base_url = "http://localhost:11434"
+        self.api_url = f"{self.base_url}/v1/chat/completions"
         self.model = "qwen2.5:1.5b"
+        self.keep_alive = "30m"
+        self.in_flight: Dict[str, int] = {}
+        # Appels de suggestions comptés à part : ils ne doivent pas empêcher le worker de démarrer
+        self.suggestions_in_flight: Dict[str, int] = {}
+        self.swap_task: Optional[asyncio.Task] = None
+        self.swap_target: Optional[str] = None
+        self.swap_state = "idle"  # idle | pulling | warming | draining | error
+        self.swap_error: Optional[str] = None
+
+    def swap_status(self) -> dict:
+        return {
+            "model": self.model,
+            "state": self.swap_state,
+            "target": self.swap_target,
+            "error": self.swap_error
+        }
+
+    def start_swap(self, model: str):
+        """Lance en arrière-plan le remplacement du modèle Ollama."""
+        if self.swap_task is not None and not self.swap_task.done():
+            raise RuntimeError(f"Changement de modèle déjà en cours vers {self.swap_target}")
+        self.swap_target = model
+        self.swap_error = None
+        self.swap_task = asyncio.create_task(self.swap_model(model))
+
+    async def swap_model(self, model: str):
+        try:
+            async with httpx.AsyncClient(timeout=None) as client:
+                # 1. Télécharger le modèle s'il est absent
+                self.swap_state = "pulling"
+                response = await client.post(
+                    f"{self.base_url}/api/pull",
+                    json={"model": model, "stream": False}
+                )
+                response.raise_for_status()
+
+                # 2. Charger en mémoire (requête sans prompt) puis préchauffer
+                self.swap_state = "warming"
+                response = await client.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": model, "keep_alive": self.keep_alive}
+                )
+                response.raise_for_status()
+                for prompt in WARMUP_PROMPTS:
+                    response = await client.post(
+                        f"{self.base_url}/api/chat",
+                        json={
+                            "model": model,
+                            "messages": [
+                                {"role": "system", "content": SYSTEM_PROMPT},
+                                {"role": "user", "content": prompt}
+                            ],
+                            "stream": False,
+                            "keep_alive": self.keep_alive,
+                            "options": {"num_predict": 4}
+                        }
+                    )
+                    response.raise_for_status()
+
+                # 3. Bascule atomique : les nouvelles requêtes utilisent le nouveau modèle
+                old_model = self.model
+                self.model = model
+                print(f"Modèle Ollama remplacé : {old_model} -> {model}")
+
+                # 4. Attendre la fin des requêtes en cours sur l'ancien modèle puis le décharger
+                if old_model != model:
+                    self.swap_state = "draining"
+                    while self.in_flight.get(old_model, 0) + self.suggestions_in_flight.get(old_model, 0) > 0:
+                        await asyncio.sleep(0.5)
+                    await client.post(
+                        f"{self.base_url}/api/generate",
+                        json={"model": old_model, "keep_alive": 0}
+                    )
+            self.swap_state = "idle"
+            self.swap_target = None
+        except Exception as e:
+            print(f"Erreur changement de modèle Ollama ({model}): {e}")
+            self.swap_state = "error"
+            self.swap_error = f"{type(e).__name__}: {e}"
         
     async def generate_response(self, history: List[Message]) -> Tuple[str, Optional[List[str]]]:
+        # Le modèle est fixé pour toute la requête, même si un changement a lieu entre-temps
+        model = self.model
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        try:
+            return await self._generate(model, history)
+        finally:
+            self.in_flight[model] -= 1
+
+    async def _generate(self, model: str, history: List[Message]) -> Tuple[str, Optional[List[str]]]:
         try:
             messages = [
                 {
                     "role": "system",
-                    "content": "Tu es un assistant IA. Réponds de manière concise et directe en français."
+                    "content": SYSTEM_PROMPT
                 }
             ]
             
-            # Stratégie : garder tout le contexte mais de manière optimisée
-            if len(history) > 8:
-                # Garder les 2 premiers messages (contexte initial)
-                for msg in history[:2]:
-                    role = "user" if msg.sender == "user" else "assistant"
-                    messages.append({"role": role, "content": msg.content})
-                
-                # Ajouter un résumé du milieu
-                middle_count = len(history) - 8
-                messages.append({
-                    "role": "system",
-                    "content": f"[{middle_count} messages précédents dans la conversation]"
-                })
-                
-                # Garder les 6 derniers messages (contexte récent)
-                for msg in history[-6:]:
-                    role = "user" if msg.sender == "user" else "assistant"
-                    messages.append({"role": role, "content": msg.content})
-            else:
-                # Conversation courte : tout envoyer
-                for msg in history:
-                    role = "user" if msg.sender == "user" else "assistant"
-                    messages.append({"role": role, "content": msg.content})
+            # Stratégie : 2 premiers messages + anciens tours pertinents (mémoire) + 6 derniers
+            selected, omitted = await memory_service.build_context(history, head=2, recent=6)
+            for i, msg in enumerate(selected):
+                if omitted and i == len(selected) - 6:
+                    # Signaler les messages du milieu non repris
+                    messages.append({
+                        "role": "system",
+                        "content": f"[{omitted} messages précédents dans la conversation]"
+                    })
+                role = "user" if msg.sender == "user" else "assistant"
+                messages.append({"role": role, "content": msg.content})
             
             async with httpx.AsyncClient(timeout=120) as client:
                 response = await client.post(
                     self.api_url,
                     json={
-                        "model": self.model,
+                        "model": model,
                         "messages": messages,
                         "temperature": 0.7,
                         "max_tokens": 150,
@@ -74,4 +181,47 @@ class ChatServiceOllama:
             print(f"{'='*60}\n")
             return f"Erreur technique: {type(e).__name__}", None
 
+    async def generate_suggestions(self, exchanges: List[dict]) -> Dict[int, List[str]]:
+        """Génère en un seul appel les suggestions de suivi de plusieurs échanges.
+
+        `exchanges` : [{"id": id du message IA, "user": question, "ai": réponse}, ...]
+        """
+        # Comme generate_response : modèle fixé pour l'appel et compté pour le drain d'un changement
+        model = self.model
+        self.suggestions_in_flight[model] = self.suggestions_in_flight.get(model, 0) + 1
+        try:
+            return await self._generate_suggestions(model, exchanges)
+        finally:
+            self.suggestions_in_flight[model] -= 1
+
+    async def _generate_suggestions(self, model: str, exchanges: List[dict]) -> Dict[int, List[str]]:
+        lines = [
+            f"[{exchange['id']}]\nUtilisateur : {exchange['user'][:500]}\nAssistant : {exchange['ai'][:500]}"
+            for exchange in exchanges
+        ]
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(
+                f"{self.base_url}/api/chat",
+                json={
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": SUGGESTIONS_PROMPT},
+                        {"role": "user", "content": "\n\n".join(lines)}
+                    ],
+                    "format": SUGGESTIONS_SCHEMA,
+                    "stream": False,
+                    "keep_alive": self.keep_alive,
+                    "options": {"temperature": 0.3, "num_predict": 80 * len(exchanges)}
+                }
+            )
+            response.raise_for_status()
+
+        data = json.loads(response.json()["message"]["content"])
+        requested = {exchange["id"] for exchange in exchanges}
+        return {
+            item["id"]: [suggestion.strip() for suggestion in item["suggestions"] if suggestion.strip()][:3]
+            for item in data.get("items", [])
+            if item.get("id") in requested
+        }
+
 chat_service = ChatServiceOllama()
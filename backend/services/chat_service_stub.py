@@ -0,0 +1,80 @@
+from typing import Dict, List, Tuple, Optional
+from models import Message
+from middleware.traffic_capture import estimate_tokens, record_llm_wait
+import os
+import json
+import time
+import random
+import asyncio
+
+class ChatServiceStub:
+    """Backend LLM simulé pour rejouer du trafic capturé.
+
+    La latence suit un modèle ajusté sur une capture (voir
+    `replay_traffic.py fit`) : base + coût par token de prompt + coût par
+    token de réponse, plus un bruit gaussien. La longueur des réponses est
+    tirée parmi celles observées. Le nombre d'appels simultanés est limité
+    comme pour un serveur Ollama réel, ce qui fait apparaître la file
+    d'attente quand la charge augmente.
+    """
+
+    def __init__(self):
+        self.model = "stub"
+        self.latency_model_file = os.getenv("STUB_LATENCY_MODEL", "latency_model.json")
+        self.concurrency = int(os.getenv("STUB_LLM_CONCURRENCY", "1"))
+        self.random = random.Random(int(os.getenv("STUB_SEED", "0")))
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight: Dict[str, int] = {}
+        self.params = {
+            "base_ms": 500.0,
+            "prompt_token_ms": 0.5,
+            "response_token_ms": 30.0,
+            "noise_ms": 0.0,
+            "response_tokens": [40]
+        }
+        if os.path.exists(self.latency_model_file):
+            with open(self.latency_model_file, encoding="utf-8") as f:
+                self.params.update(json.load(f))
+            print(f"Modèle de latence chargé depuis {self.latency_model_file}")
+
+    def swap_status(self) -> dict:
+        return {"model": self.model, "state": "idle", "target": None, "error": None}
+
+    def start_swap(self, model: str):
+        raise RuntimeError("Changement de modèle non supporté par le backend simulé")
+
+    async def generate_response(self, history: List[Message]) -> Tuple[str, Optional[List[str]]]:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        prompt_tokens = sum(estimate_tokens(msg.content) for msg in history)
+        response_tokens = self.random.choice(self.params["response_tokens"])
+        latency_ms = (
+            self.params["base_ms"]
+            + self.params["prompt_token_ms"] * prompt_tokens
+            + self.params["response_token_ms"] * response_tokens
+            + self.random.gauss(0, self.params["noise_ms"])
+        )
+
+        self.in_flight[self.model] = self.in_flight.get(self.model, 0) + 1
+        try:
+            start = time.perf_counter()
+            async with self.semaphore:
+                record_llm_wait((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(max(latency_ms, 0) / 1000)
+        finally:
+            self.in_flight[self.model] -= 1
+
+        return " ".join(["lorem"] * response_tokens), None
+
+    async def generate_suggestions(self, exchanges: List[dict]) -> Dict[int, List[str]]:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        # ~3 suggestions de 8 tokens par échange, dans un seul appel
+        latency_ms = self.params["base_ms"] + self.params["response_token_ms"] * 24 * len(exchanges)
+        async with self.semaphore:
+            await asyncio.sleep(latency_ms / 1000)
+        return {exchange["id"]: ["lorem ipsum ?"] * 3 for exchange in exchanges}
+
+chat_service = ChatServiceStub()
@@ -4,6 +4,8 @@ from sqlalchemy.orm import selectinload
 from typing import List
 from models import Conversation, Message
 from schemas import ConversationCreate
+from services.message_write_buffer import message_write_buffer
+from services.archive_service import archive_service
 
 class HistoryService:
     def __init__(self, session: AsyncSession):
@@ -22,7 +24,13 @@ class HistoryService:
     async def get_conversation(self, conversation_id: int) -> Conversation:
         statement = select(Conversation).options(selectinload(Conversation.messages)).where(Conversation.id == conversation_id)
         result = await self.session.execute(statement)
-        return result.scalar_one_or_none()
+        conversation = result.scalar_one_or_none()
+        if conversation and conversation.archived_at is not None:
+            # Conversation archivée : réhydrater les messages puis recharger
+            await archive_service.rehydrate(self.session, conversation_id)
+            result = await self.session.execute(statement.execution_options(populate_existing=True))
+            conversation = result.scalar_one_or_none()
+        return conversation
 
     async def add_message(self, conversation_id: int, sender: str, content: str, suggestions: List[str] = None) -> Message:
         message = Message(
@@ -31,6 +39,11 @@ class HistoryService:
             content=content,
             suggestions=suggestions
         )
+        if message_write_buffer.accepting():
+            # Mode write-behind : insertion groupée, retour une fois durable.
+            # Pendant l'arrêt, le tampon se vide et on repasse au commit direct.
+            return await message_write_buffer.submit(message)
+
         self.session.add(message)
         await self.session.commit()
         await self.session.refresh(message)
@@ -61,6 +74,7 @@ class HistoryService:
         if conversation:
             await self.session.delete(conversation)
             await self.session.commit()
+        archive_service.discard(conversation_id)
     
     async def rename_conversation(self, conversation_id: int, title: str) -> Conversation:
         statement = select(Conversation).options(selectinload(Conversation.messages)).where(Conversation.id == conversation_id)
@@ -0,0 +1,294 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+from models import Message
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class MemoryService:
+    """Mémoire long terme : index d'embeddings par conversation.
+
+    Chaque message est encodé en arrière-plan après son enregistrement,
+    par lots, avec un petit modèle d'embedding CPU. Les vecteurs sont
+    stockés en float16 dans des fichiers numpy préalloués par conversation
+    (ouverts en memory-map, cache LRU borné), et les anciens tours les plus pertinents sont retrouvés
+    par similarité cosinus au moment de construire le prompt.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.tokenizer = None
+        self.model_name = os.getenv(
+            "MEMORY_EMBEDDING_MODEL",
+            "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+        )
+        self.index_dir = Path(os.getenv("MEMORY_INDEX_DIR", "./memory_index"))
+        self.batch_size = int(os.getenv("MEMORY_BATCH_SIZE", "16"))
+        self.top_k = int(os.getenv("MEMORY_TOP_K", "4"))
+        # Désactivé par défaut : le modèle d'embedding est téléchargé au premier usage
+        self.enabled = os.getenv("MEMORY_ENABLED", "0") == "1"
+        self.cache_size = int(os.getenv("MEMORY_CACHE_SIZE", "64"))
+        self.initial_capacity = 64
+        self.loading = False
+        # Indexation (et chargement du modèle) d'un côté, recherche de l'autre :
+        # la construction du prompt n'attend jamais un lot d'indexation
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.index_lock = threading.Lock()
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        # conversation_id -> {"ids", "vectors" (memory-maps préalloués), "count"}, LRU
+        self.indexes: "OrderedDict[int, dict]" = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Modèle d'embedding
+    # ------------------------------------------------------------------
+
+    def _load_model_sync(self):
+        if self.model is None and not self.loading:
+            self.loading = True
+            try:
+                from transformers import AutoModel, AutoTokenizer
+
+                print(f"Chargement du modèle d'embedding {self.model_name}...")
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self.model = AutoModel.from_pretrained(self.model_name, low_cpu_mem_usage=True)
+                self.model.eval()
+                for param in self.model.parameters():
+                    param.requires_grad = False
+                print("Modèle d'embedding OK")
+            except Exception as e:
+                print(f"Erreur chargement modèle d'embedding: {e}")
+                self.model = None
+                self.enabled = False
+            finally:
+                self.loading = False
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        self._load_model_sync()
+        if self.model is None:
+            return np.zeros((0, 0), dtype=np.float16)
+
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=256,
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+
+        # Mean pooling sur les tokens réels puis normalisation L2
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.numpy().astype(np.float16)
+
+    # ------------------------------------------------------------------
+    # Index par conversation
+    # ------------------------------------------------------------------
+
+    def _paths(self, conversation_id: int) -> Tuple[Path, Path]:
+        return (
+            self.index_dir / f"{conversation_id}.ids.npy",
+            self.index_dir / f"{conversation_id}.vec.npy"
+        )
+
+    def _cache_put(self, conversation_id: int, entry: dict):
+        self.indexes[conversation_id] = entry
+        self.indexes.move_to_end(conversation_id)
+        while len(self.indexes) > self.cache_size:
+            # Fermer le memory-map le moins récemment utilisé
+            _, evicted = self.indexes.popitem(last=False)
+            evicted["vectors"].flush()
+            evicted["ids"].flush()
+
+    def _get_index(self, conversation_id: int) -> Optional[dict]:
+        """Index d'une conversation, ouvert en memory-map (cache LRU borné)."""
+        if conversation_id in self.indexes:
+            self.indexes.move_to_end(conversation_id)
+            return self.indexes[conversation_id]
+
+        ids_path, vec_path = self._paths(conversation_id)
+        if not ids_path.exists() or not vec_path.exists():
+            return None
+
+        ids = np.load(ids_path, mmap_mode="r+")
+        # Fichiers préalloués : les emplacements libres ont l'id -1
+        entry = {
+            "ids": ids,
+            "vectors": np.load(vec_path, mmap_mode="r+"),
+            "count": int(np.count_nonzero(ids >= 0))
+        }
+        self._cache_put(conversation_id, entry)
+        return entry
+
+    def _allocate_sync(self, conversation_id: int, capacity: int, dim: int, ids: np.ndarray, vectors: np.ndarray) -> dict:
+        """Crée les fichiers préalloués d'une conversation, avec les lignes déjà indexées."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        ids_path, vec_path = self._paths(conversation_id)
+        ids_tmp, vec_tmp = ids_path.with_suffix(".tmp"), vec_path.with_suffix(".tmp")
+
+        new_ids = np.lib.format.open_memmap(ids_tmp, mode="w+", dtype=np.int64, shape=(capacity,))
+        new_vectors = np.lib.format.open_memmap(vec_tmp, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        new_ids[:] = -1
+        new_ids[:len(ids)] = ids
+        new_vectors[:len(vectors)] = vectors
+        new_ids.flush()
+        new_vectors.flush()
+        del new_ids, new_vectors
+
+        os.replace(ids_tmp, ids_path)
+        os.replace(vec_tmp, vec_path)
+        return self._get_index(conversation_id)
+
+    def _append_sync(self, conversation_id: int, ids: List[int], vectors: np.ndarray):
+        with self.index_lock:
+            entry = self._get_index(conversation_id)
+            count = entry["count"] if entry else 0
+            needed = count + len(ids)
+            if entry is None or needed > len(entry["ids"]):
+                # Capacité doublée : l'ajout reste en O(lot) amorti
+                capacity = max(self.initial_capacity, needed, 2 * len(entry["ids"]) if entry else 0)
+                old_ids = np.array(entry["ids"][:count]) if entry else np.zeros(0, dtype=np.int64)
+                old_vectors = np.array(entry["vectors"][:count]) if entry else np.zeros((0, vectors.shape[1]), dtype=np.float16)
+                # Fermer les anciens memory-maps avant de remplacer les fichiers (Windows)
+                self.indexes.pop(conversation_id, None)
+                entry = None
+                entry = self._allocate_sync(conversation_id, capacity, vectors.shape[1], old_ids, old_vectors)
+
+            entry["vectors"][count:needed] = vectors
+            entry["ids"][count:needed] = np.asarray(ids, dtype=np.int64)
+            entry["vectors"].flush()
+            entry["ids"].flush()
+            entry["count"] = needed
+
+    def _index_batch_sync(self, batch: List[Tuple[int, int, str]]):
+        vectors = self._embed_sync([content for _, _, content in batch])
+        if len(vectors) == 0:
+            return
+
+        by_conversation: Dict[int, List[int]] = {}
+        for row, (conversation_id, _, _) in enumerate(batch):
+            by_conversation.setdefault(conversation_id, []).append(row)
+
+        for conversation_id, rows in by_conversation.items():
+            ids = [batch[row][1] for row in rows]
+            self._append_sync(conversation_id, ids, vectors[rows])
+
+    def _search_sync(self, conversation_id: int, query: str, candidate_ids: List[int], k: int) -> List[int]:
+        if not candidate_ids or not self._paths(conversation_id)[0].exists():
+            return []
+
+        query_vector = self._embed_sync([query])
+        if len(query_vector) == 0:
+            return []
+
+        with self.index_lock:
+            entry = self._get_index(conversation_id)
+            if entry is None:
+                return []
+            ids = np.array(entry["ids"][:entry["count"]])
+            mask = np.isin(ids, np.asarray(candidate_ids, dtype=np.int64))
+            if not mask.any():
+                return []
+            # Seules les lignes candidates sont lues depuis le fichier
+            candidates = np.asarray(entry["vectors"][:entry["count"]][mask], dtype=np.float32)
+
+        # Vecteurs normalisés : le produit scalaire est la similarité cosinus
+        scores = candidates @ query_vector[0].astype(np.float32)
+        top = np.argsort(-scores)[:k]
+        return ids[mask][top].tolist()
+
+    def _forget_sync(self, conversation_id: int):
+        with self.index_lock:
+            self.indexes.pop(conversation_id, None)
+            for path in self._paths(conversation_id):
+                if path.exists():
+                    path.unlink()
+
+    # ------------------------------------------------------------------
+    # API asynchrone
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        if not self.enabled or self.worker is not None:
+            return
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        # Indexer ce qui reste avant l'arrêt
+        await self.queue.join()
+        self.worker.cancel()
+        self.worker = None
+
+    def schedule(self, message: Message):
+        """Met un message en file d'attente d'indexation (non bloquant)."""
+        if self.queue is None or not self.enabled:
+            return
+        self.queue.put_nowait((message.conversation_id, message.id, message.content))
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await loop.run_in_executor(self.executor, self._index_batch_sync, batch)
+            except Exception as e:
+                print(f"Erreur indexation mémoire: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def forget(self, conversation_id: int):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self._forget_sync, conversation_id)
+
+    async def build_context(self, history: List[Message], head: int = 2, recent: int = 6) -> Tuple[List[Message], int]:
+        """Sélectionne les messages à envoyer au modèle.
+
+        Garde les `head` premiers et les `recent` derniers messages, et
+        ajoute entre les deux les `top_k` anciens tours les plus proches
+        du dernier message. Retourne les messages retenus (dans l'ordre
+        chronologique) et le nombre de messages omis.
+        """
+        if len(history) <= head + recent:
+            return list(history), 0
+
+        middle = history[head:-recent]
+        recalled_ids = []
+        # Pas de rappel tant que le modèle d'embedding n'est pas chargé par l'indexation
+        if self.enabled and self.model is not None:
+            try:
+                loop = asyncio.get_event_loop()
+                recalled_ids = await loop.run_in_executor(
+                    self.search_executor,
+                    self._search_sync,
+                    history[-1].conversation_id,
+                    history[-1].content,
+                    [msg.id for msg in middle],
+                    self.top_k
+                )
+            except Exception as e:
+                print(f"Erreur recherche mémoire: {e}")
+
+        recalled_ids = set(recalled_ids)
+        recalled = [msg for msg in middle if msg.id in recalled_ids]
+        selected = list(history[:head]) + recalled + list(history[-recent:])
+        return selected, len(middle) - len(recalled)
+
+
+memory_service = MemoryService()
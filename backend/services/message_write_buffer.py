@@ -0,0 +1,131 @@
+from typing import List, Optional, Tuple
+from models import Message
+from sqlalchemy import insert, text
+import os
+import time
+import asyncio
+
+
+class MessageWriteBuffer:
+    """Write-behind pour les insertions de messages (group commit).
+
+    Les messages sont mis en tampon en mémoire puis écrits par un seul
+    INSERT multi-lignes dans une transaction, toutes les `flush_interval_ms`
+    millisecondes ou dès que `max_rows` messages sont en attente. Chaque
+    appelant attend un future résolu une fois sa ligne committée. Un seul
+    écrivain vide la file dans l'ordre d'arrivée, ce qui conserve l'ordre
+    des messages d'une même conversation.
+    """
+
+    def __init__(self, session_factory=None):
+        self.enabled = os.getenv("MESSAGE_WRITE_BEHIND", "0") == "1"
+        self.flush_interval_ms = float(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "5"))
+        self.max_rows = int(os.getenv("MESSAGE_FLUSH_MAX_ROWS", "64"))
+        self.session_factory = session_factory
+        self.pending: List[Tuple[Message, asyncio.Future]] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.closing = False
+        # Statistiques pour le benchmark
+        self.flushes = 0
+        self.rows_written = 0
+
+    def accepting(self) -> bool:
+        """Vrai si le tampon est actif et n'est pas en cours d'arrêt."""
+        return self.worker is not None and not self.closing
+
+    async def start(self):
+        if not self.enabled or self.worker is not None:
+            return
+        if self.session_factory is None:
+            from database import AsyncSessionLocal
+            self.session_factory = AsyncSessionLocal
+        self.closing = False
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Vide le tampon puis arrête l'écrivain."""
+        if self.worker is None:
+            return
+        self.closing = True
+        self.wakeup.set()
+        await self.worker
+        self.worker = None
+
+    async def submit(self, message: Message) -> Message:
+        """Ajoute un message au tampon et attend qu'il soit durable."""
+        if self.worker is None or self.closing:
+            raise RuntimeError("Le tampon d'écriture des messages n'est pas démarré")
+
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((message, future))
+        # Premier message : réveille l'écrivain inactif, qui démarre l'échéance du lot
+        if len(self.pending) == 1 or len(self.pending) >= self.max_rows:
+            self.wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                if self.closing:
+                    return
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            # Laisser le lot se remplir jusqu'à l'échéance ou la taille max
+            deadline = time.monotonic() + self.flush_interval_ms / 1000
+            while len(self.pending) < self.max_rows and not self.closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                self.wakeup.clear()
+
+            batch = self.pending[:self.max_rows]
+            self.pending = self.pending[self.max_rows:]
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Message, asyncio.Future]]):
+        try:
+            async with self.session_factory() as session:
+                # Ids réservés sur la séquence puis attribués côté client dans l'ordre du lot :
+                # l'ordre des lignes renvoyées par INSERT ... RETURNING n'est pas garanti
+                result = await session.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('message', 'id')) FROM generate_series(1, :n)"),
+                    {"n": len(batch)}
+                )
+                ids = sorted(row[0] for row in result.all())
+                rows = [
+                    {
+                        "id": message_id,
+                        "conversation_id": message.conversation_id,
+                        "sender": message.sender,
+                        "content": message.content,
+                        "timestamp": message.timestamp,
+                        "suggestions": message.suggestions
+                    }
+                    for (message, _), message_id in zip(batch, ids)
+                ]
+                await session.execute(insert(Message.__table__).values(rows))
+                await session.commit()
+        except Exception as e:
+            print(f"Erreur écriture groupée des messages: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.flushes += 1
+        self.rows_written += len(batch)
+        for (message, future), message_id in zip(batch, ids):
+            message.id = message_id
+            if not future.done():
+                future.set_result(message)
+
+
+message_write_buffer = MessageWriteBuffer()
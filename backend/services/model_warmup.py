@@ -0,0 +1,5 @@
+# Prompts représentatifs utilisés pour préchauffer un nouveau modèle avant de le servir
+WARMUP_PROMPTS = [
+    "Bonjour, comment vas-tu ?",
+    "Peux-tu m'expliquer simplement ce qu'est une base de données ?",
+]
@@ -0,0 +1,158 @@
+from typing import List, Optional
+from collections import deque
+from sqlalchemy import bindparam, update
+from models import Message
+from middleware.traffic_capture import estimate_tokens
+import os
+import time
+import asyncio
+
+
+class SuggestionService:
+    """Suggestions de suivi générées hors du chemin critique.
+
+    Après l'enregistrement d'une réponse IA, l'échange est mis en file
+    (sans attendre). Un worker de basse priorité attend que le backend LLM
+    soit inactif, génère les suggestions de plusieurs conversations en un
+    seul appel à sortie structurée, puis les écrit en base par UPDATE. Elles
+    sont servies au prochain `GET /conversations/{id}`. Un lot est annulé dès
+    qu'une requête de chat démarre et ses échanges sont remis en tête de
+    file. Les échanges encore en file à l'arrêt sont abandonnés (les
+    suggestions sont facultatives).
+    """
+
+    def __init__(self, chat_service=None):
+        self.chat_service = chat_service
+        self.enabled = os.getenv("SUGGESTIONS_ENABLED", "1") == "1"
+        self.batch_size = int(os.getenv("SUGGESTIONS_BATCH_SIZE", "8"))
+        self.idle_ms = float(os.getenv("SUGGESTIONS_IDLE_MS", "500"))
+        self.max_pending = int(os.getenv("SUGGESTIONS_MAX_PENDING", "1000"))
+        # Budget d'un lot : tokens de prompt et durée maximale de l'appel
+        self.max_tokens = int(os.getenv("SUGGESTIONS_MAX_TOKENS", "1500"))
+        self.timeout_s = float(os.getenv("SUGGESTIONS_TIMEOUT_S", "30"))
+        # Au-delà de max_pending, les échanges les plus anciens sont abandonnés
+        self.pending = deque(maxlen=self.max_pending)
+        self.wakeup: Optional[asyncio.Event] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.preempted = 0
+
+    async def start(self):
+        if not self.enabled or self.worker is not None:
+            return
+        if self.chat_service is None:
+            from services.chat_backend import chat_service
+            self.chat_service = chat_service
+        if not hasattr(self.chat_service, "generate_suggestions"):
+            print("Suggestions désactivées : backend LLM sans generate_suggestions")
+            return
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def enqueue(self, ai_message: Message, user_content: str):
+        """Met un échange en file pour générer ses suggestions (non bloquant)."""
+        if self.worker is None:
+            return
+        self.pending.append({
+            "id": ai_message.id,
+            "timestamp": ai_message.timestamp,
+            "user": user_content,
+            "ai": ai_message.content
+        })
+        self.wakeup.set()
+
+    def _backend_busy(self) -> bool:
+        return sum(getattr(self.chat_service, "in_flight", {}).values()) > 0
+
+    async def _wait_for_idle(self):
+        # Le backend doit rester inactif pendant idle_ms avant de lancer un lot
+        idle_since = None
+        while True:
+            if self._backend_busy():
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            elif (time.monotonic() - idle_since) * 1000 >= self.idle_ms:
+                return
+            await asyncio.sleep(min(self.idle_ms, 100) / 1000)
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            await self._wait_for_idle()
+            batch = self._next_batch()
+            try:
+                suggestions = await self._generate(batch)
+                if suggestions is None:
+                    # Préempté par une requête de chat : le lot repasse en tête de file
+                    self.pending.extendleft(reversed(batch))
+                    self.preempted += 1
+                    continue
+                await self._save(batch, suggestions)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erreur génération des suggestions ({len(batch)} échanges): {e}")
+
+    def _next_batch(self) -> List[dict]:
+        """Prend jusqu'à batch_size échanges sans dépasser max_tokens (au moins un)."""
+        batch = []
+        tokens = 0
+        while self.pending and len(batch) < self.batch_size:
+            exchange = self.pending[0]
+            exchange_tokens = estimate_tokens(exchange["user"]) + estimate_tokens(exchange["ai"])
+            if batch and tokens + exchange_tokens > self.max_tokens:
+                break
+            batch.append(self.pending.popleft())
+            tokens += exchange_tokens
+        return batch
+
+    async def _generate(self, batch: List[dict]) -> Optional[dict]:
+        """Appelle le backend, annule l'appel si une requête de chat démarre (retourne None)."""
+        task = asyncio.create_task(self.chat_service.generate_suggestions(batch))
+        deadline = time.monotonic() + self.timeout_s
+        try:
+            while not task.done():
+                if self._backend_busy():
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"lot non terminé après {self.timeout_s:.0f} s")
+                await asyncio.wait({task}, timeout=min(remaining, 0.05))
+            return task.result()
+        finally:
+            # Annule la requête HTTP encore en cours (préemption, délai dépassé ou arrêt)
+            task.cancel()
+
+    async def _save(self, batch: List[dict], suggestions: dict):
+        from database import AsyncSessionLocal
+
+        rows = [
+            {"message_id": exchange["id"], "message_timestamp": exchange["timestamp"], "new_suggestions": suggestions[exchange["id"]]}
+            for exchange in batch
+            if suggestions.get(exchange["id"])
+        ]
+        if not rows:
+            return
+
+        # Le timestamp (clé de partition) permet de ne toucher qu'une partition
+        statement = (
+            update(Message.__table__)
+            .where(Message.__table__.c.id == bindparam("message_id"))
+            .where(Message.__table__.c.timestamp == bindparam("message_timestamp"))
+            .values(suggestions=bindparam("new_suggestions"))
+        )
+        async with AsyncSessionLocal() as session:
+            await session.execute(statement, rows)
+            await session.commit()
+
+
+suggestion_service = SuggestionService()
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+import routers.admin as admin
+from services.chat_service import ChatService
+
+app = FastAPI()
+app.include_router(admin.router)
+
+
+def make_service(monkeypatch, loaded=None, release=None):
+    service = ChatService()
+    service.model, service.tokenizer = "ancien-modele", "ancien-tokenizer"
+
+    def load_bundle(model_path):
+        if release is not None:
+            release.wait(timeout=5)
+        if loaded is not None:
+            loaded.append(model_path)
+        return f"modele:{model_path}", f"tokenizer:{model_path}"
+
+    monkeypatch.setattr(service, "_load_bundle_sync", load_bundle)
+    monkeypatch.setattr(service, "_warmup_sync", lambda model, tokenizer: None)
+    monkeypatch.setattr(admin, "chat_service", service)
+    return service
+
+
+def client():
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_admin_disabled_without_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    make_service(monkeypatch)
+    async with client() as ac:
+        response = await ac.post("/admin/model", json={"model": "./models/autre"})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_admin_rejects_wrong_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    make_service(monkeypatch)
+    async with client() as ac:
+        response = await ac.get("/admin/model", headers={"X-Admin-Token": "mauvais"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_local_model_swap(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    loaded = []
+    service = make_service(monkeypatch, loaded=loaded)
+    async with client() as ac:
+        response = await ac.post(
+            "/admin/model", json={"model": "./models/autre"}, headers={"X-Admin-Token": "secret"}
+        )
+        assert response.status_code == 202
+        await asyncio.wait_for(service.swap_task, timeout=5)
+        response = await ac.get("/admin/model", headers={"X-Admin-Token": "secret"})
+
+    assert loaded == ["./models/autre"]
+    assert response.json() == {"model": "./models/autre", "state": "idle", "target": None, "error": None}
+    assert service.model == "modele:./models/autre"
+    assert service.tokenizer == "tokenizer:./models/autre"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_swap_is_rejected(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    release = threading.Event()
+    service = make_service(monkeypatch, release=release)
+    headers = {"X-Admin-Token": "secret"}
+    async with client() as ac:
+        first = await ac.post("/admin/model", json={"model": "a"}, headers=headers)
+        second = await ac.post("/admin/model", json={"model": "b"}, headers=headers)
+        release.set()
+        await asyncio.wait_for(service.swap_task, timeout=5)
+
+    assert first.status_code == 202
+    assert second.status_code == 409
+    assert service.model == "modele:a"
+
+
+class FakeTokenizer:
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def get_vocab(self):
+        return self.vocab
+
+
+@pytest.mark.asyncio
+async def test_swap_disables_draft_with_incompatible_tokenizer(monkeypatch):
+    service = ChatService()
+    service.draft_bundle = ("brouillon", FakeTokenizer({"a": 0, "b": 1}))
+    service.draft_model = "brouillon"
+    vocabs = {"./models/meme-famille": {"a": 0, "b": 1}, "./models/autre-famille": {"x": 0}}
+    monkeypatch.setattr(service, "_load_bundle_sync", lambda path: (f"modele:{path}", FakeTokenizer(vocabs[path])))
+    monkeypatch.setattr(service, "_warmup_sync", lambda model, tokenizer: None)
+
+    await service.swap_model("./models/autre-famille")
+    assert service.model == "modele:./models/autre-famille"
+    assert service.draft_model is None
+
+    await service.swap_model("./models/meme-famille")
+    assert service.draft_model == "brouillon"
+
+
+@pytest.mark.asyncio
+async def test_swap_rejected_during_initial_load(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    service = make_service(monkeypatch)
+    service.model, service.tokenizer = None, None
+    service.loading = True
+    async with client() as ac:
+        response = await ac.post(
+            "/admin/model", json={"model": "./models/autre"}, headers={"X-Admin-Token": "secret"}
+        )
+    assert response.status_code == 409
+    assert service.swap_task is None
+
+
+@pytest.mark.asyncio
+async def test_initial_load_does_not_override_finished_swap(monkeypatch):
+    release = threading.Event()
+    service = make_service(monkeypatch)
+    service.model, service.tokenizer = None, None
+    initial_path = service.model_path
+
+    def load_bundle(model_path):
+        if model_path == initial_path:
+            # Le chargement initial se termine après le changement de modèle
+            release.wait(timeout=5)
+        return f"modele:{model_path}", f"tokenizer:{model_path}"
+
+    monkeypatch.setattr(service, "_load_bundle_sync", load_bundle)
+    preload = threading.Thread(target=service._load_model_sync)
+    # Le changement démarre avant que le préchargement ne marque le chargement en cours
+    service.start_swap("./models/autre")
+    preload.start()
+    await asyncio.wait_for(service.swap_task, timeout=5)
+    release.set()
+    preload.join(timeout=5)
+
+    assert service.model == "modele:./models/autre"
+    assert service.model_path == "./models/autre"
+    assert not service.loading
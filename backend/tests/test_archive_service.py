@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Conversation, Message
+from services.archive_service import ArchiveService
+
+
+class FakeResult:
+    def __init__(self, values):
+        self.values = values
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return list(self.values)
+
+    def scalar_one_or_none(self):
+        return self.values[0] if self.values else None
+
+
+class FakeSession:
+    """Simule une AsyncSession sur des listes en mémoire, pour les requêtes de l'archive."""
+
+    def __init__(self, conversations, messages):
+        self.conversations = {conversation.id: conversation for conversation in conversations}
+        self.messages = list(messages)
+        self.commits = 0
+        self.rollbacks = 0
+        self.statements = []
+        # Appelé juste avant la lecture des messages (simule une écriture concurrente)
+        self.before_messages = None
+
+    def _param(self, params, prefix):
+        return next(value for key, value in params.items() if key.startswith(prefix))
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        params = statement.compile().params
+        if statement.is_insert:
+            count = len({key.rsplit("_m", 1)[1] for key in params})
+            for i in range(count):
+                self.messages.append(Message(**{
+                    column: params[f"{column}_m{i}"]
+                    for column in ("id", "conversation_id", "sender", "content", "timestamp", "suggestions")
+                }))
+            return FakeResult([])
+
+        if statement.is_delete:
+            conversation_id = self._param(params, "conversation_id")
+            self.messages = [msg for msg in self.messages if msg.conversation_id != conversation_id]
+            return FakeResult([])
+
+        description = statement.column_descriptions[0]
+        if description["type"] is Message:
+            if self.before_messages is not None:
+                self.before_messages(self)
+            conversation_id = self._param(params, "conversation_id")
+            messages = [msg for msg in self.messages if msg.conversation_id == conversation_id]
+            return FakeResult(sorted(messages, key=lambda msg: msg.timestamp))
+
+        if description["type"] is Conversation:
+            return FakeResult([c for c in [self.conversations.get(self._param(params, "id"))] if c])
+
+        # Sélection des conversations inactives (archive_idle)
+        cutoff = self._param(params, "created_at")
+        limit = self._param(params, "param")
+        idle = [
+            conversation for conversation in self.conversations.values()
+            if conversation.archived_at is None
+            and conversation.created_at < cutoff
+            and not any(
+                msg.conversation_id == conversation.id and msg.timestamp >= cutoff
+                for msg in self.messages
+            )
+        ]
+        idle.sort(key=lambda conversation: conversation.created_at)
+        return FakeResult([conversation.id for conversation in idle[:limit]])
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+NOW = datetime.utcnow()
+
+
+def conversation(conversation_id, days_ago, archived=False):
+    return Conversation(
+        id=conversation_id, title=f"c{conversation_id}", mode="user_initiated",
+        created_at=NOW - timedelta(days=days_ago),
+        archived_at=NOW if archived else None
+    )
+
+
+def message(message_id, conversation_id, days_ago, suggestions=None):
+    return Message(
+        id=message_id, conversation_id=conversation_id, sender="user",
+        content=f"message {message_id}", timestamp=NOW - timedelta(days=days_ago),
+        suggestions=suggestions
+    )
+
+
+def make_service(tmp_path, idle_days=30, batch_size=100):
+    service = ArchiveService()
+    service.archive_dir = tmp_path
+    service.idle_days = idle_days
+    service.batch_size = batch_size
+    return service
+
+
+@pytest.mark.asyncio
+async def test_archive_then_rehydrate_restores_ids_and_suggestions(tmp_path):
+    service = make_service(tmp_path)
+    messages = [message(7, 1, 50), message(9, 1, 40, suggestions=["Et ensuite ?", "Pourquoi ?"])]
+    session = FakeSession([conversation(1, 60)], messages)
+
+    assert await service.archive_conversation(session, 1, NOW - timedelta(days=30))
+    assert session.messages == []
+    assert session.conversations[1].archived_at is not None
+    assert service._path(1).exists()
+
+    await service.rehydrate(session, 1)
+
+    assert [(msg.id, msg.suggestions) for msg in session.messages] == [
+        (7, None), (9, ["Et ensuite ?", "Pourquoi ?"])
+    ]
+    assert [msg.timestamp for msg in session.messages] == [msg.timestamp for msg in messages]
+    assert session.conversations[1].archived_at is None
+    assert not service._path(1).exists()
+
+
+@pytest.mark.asyncio
+async def test_empty_conversation_round_trip(tmp_path):
+    service = make_service(tmp_path)
+    session = FakeSession([conversation(1, 60)], [])
+
+    assert await service.archive_conversation(session, 1, NOW - timedelta(days=30))
+    await service.rehydrate(session, 1)
+
+    assert session.messages == []
+    assert session.conversations[1].archived_at is None
+    assert not any(statement.is_insert for statement in session.statements)
+
+
+@pytest.mark.asyncio
+async def test_recent_message_after_selection_cancels_archive(tmp_path):
+    service = make_service(tmp_path)
+    session = FakeSession([conversation(1, 60)], [message(1, 1, 50)])
+    # Un message arrive entre la sélection et le verrouillage
+    session.before_messages = lambda s: s.messages.append(message(2, 1, 0))
+
+    assert not await service.archive_conversation(session, 1, NOW - timedelta(days=30))
+
+    assert session.rollbacks == 1
+    assert len(session.messages) == 2
+    assert session.conversations[1].archived_at is None
+    assert not service._path(1).exists()
+
+
+@pytest.mark.asyncio
+async def test_already_archived_conversation_is_skipped(tmp_path):
+    service = make_service(tmp_path)
+    session = FakeSession([conversation(1, 60, archived=True)], [])
+
+    assert not await service.archive_conversation(session, 1, NOW - timedelta(days=30))
+    assert session.rollbacks == 1
+
+
+@pytest.mark.asyncio
+async def test_archive_idle_selects_only_inactive_conversations_by_batch(tmp_path):
+    service = make_service(tmp_path, batch_size=2)
+    conversations = [
+        conversation(1, 90),                 # inactive
+        conversation(2, 80),                 # message récent
+        conversation(3, 70),                 # inactive, sans message
+        conversation(4, 10),                 # trop récente
+        conversation(5, 60, archived=True),  # déjà archivée
+        conversation(6, 50),                 # inactive
+    ]
+    messages = [message(1, 1, 85), message(2, 2, 75), message(3, 2, 1), message(4, 6, 45)]
+    session = FakeSession(conversations, messages)
+
+    assert await service.archive_idle(session) == 2
+    assert await service.archive_idle(session) == 1
+    assert await service.archive_idle(session) == 0
+
+    archived = sorted(c.id for c in session.conversations.values() if c.archived_at is not None)
+    assert archived == [1, 3, 5, 6]
+    assert sorted(msg.id for msg in session.messages) == [2, 3]
+
+    # Sélection par sonde NOT EXISTS sur les messages récents, sans agrégat sur toute la table
+    sql = str(session.statements[0])
+    assert "NOT (EXISTS" in sql and "GROUP BY" not in sql
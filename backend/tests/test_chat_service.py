@@ -0,0 +1,53 @@
+from services.chat_service import SYSTEM_PROMPT, ChatService
+
+
+class WordTokenizer:
+    """Tokenizer factice : un token par mot, plus un par message pour le gabarit."""
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=False):
+        tokens = []
+        for message in messages:
+            tokens += ["<msg>"] + message["content"].split()
+        if add_generation_prompt:
+            tokens.append("<assistant>")
+        return tokens if tokenize else " ".join(tokens)
+
+
+class FakeMessage:
+    def __init__(self, sender, words):
+        self.sender = sender
+        self.content = " ".join([f"{sender}{i}" for i in range(words)])
+
+
+def prompt_budget(extra):
+    # Prompt système + gabarit + `extra` tokens
+    return len(SYSTEM_PROMPT.split()) + 2 + extra
+
+
+def test_prompt_keeps_system_and_latest_message_first():
+    service = ChatService()
+    service.max_prompt_tokens = prompt_budget(11)
+    recalled = [FakeMessage("user", 10)]
+    recent = [FakeMessage("user", 10), FakeMessage("ai", 10), FakeMessage("user", 10)]
+
+    messages = service._fit_prompt_sync(WordTokenizer(), recalled, recent)
+
+    assert messages == [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": recent[-1].content}
+    ]
+
+
+def test_prompt_prefers_recalled_turns_then_recent_in_order():
+    service = ChatService()
+    # Place pour le dernier message, un tour rappelé et un seul message récent
+    service.max_prompt_tokens = prompt_budget(3 * 11)
+    recalled = [FakeMessage("ai", 10)]
+    recent = [FakeMessage("user", 10), FakeMessage("ai", 10), FakeMessage("user", 10)]
+
+    messages = service._fit_prompt_sync(WordTokenizer(), recalled, recent)
+
+    assert [message["content"] for message in messages[1:]] == [
+        recalled[0].content, recent[1].content, recent[2].content
+    ]
+    assert messages[2]["role"] == "assistant"
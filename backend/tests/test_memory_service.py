@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from services.memory_service import MemoryService
+
+VECTORS = {
+    "chat": [1.0, 0.0, 0.0],
+    "chien": [0.0, 1.0, 0.0],
+    "oiseau": [0.0, 0.0, 1.0],
+}
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, conversation_id=1):
+        self.id = message_id
+        self.conversation_id = conversation_id
+        self.content = content
+
+
+def make_service(tmp_path, monkeypatch, **settings):
+    service = MemoryService()
+    service.index_dir = tmp_path
+    service.initial_capacity = 4
+    for name, value in settings.items():
+        setattr(service, name, value)
+    # Embeddings déterministes : pas de modèle à télécharger
+    monkeypatch.setattr(
+        service, "_embed_sync",
+        lambda texts: np.array([VECTORS[text] for text in texts], dtype=np.float16)
+    )
+    return service
+
+
+def index(service, conversation_id, contents, first_id=1):
+    batch = [(conversation_id, first_id + i, content) for i, content in enumerate(contents)]
+    service._index_batch_sync(batch)
+
+
+def test_index_grows_by_doubling_with_padding(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch)
+    index(service, 1, ["chat", "chien", "oiseau"])
+    assert len(service.indexes[1]["ids"]) == 4
+
+    index(service, 1, ["chat", "chien"], first_id=4)
+    entry = service.indexes[1]
+    assert len(entry["ids"]) == 8
+    assert entry["count"] == 5
+    assert entry["ids"].tolist() == [1, 2, 3, 4, 5, -1, -1, -1]
+    assert entry["vectors"][3].tolist() == VECTORS["chat"]
+
+
+def test_count_is_rebuilt_on_reopen(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch)
+    index(service, 1, ["chat", "chien", "oiseau", "chat", "chien"])
+
+    reopened = make_service(tmp_path, monkeypatch)
+    entry = reopened._get_index(1)
+    assert entry["count"] == 5
+
+    index(reopened, 1, ["oiseau"], first_id=6)
+    assert reopened._get_index(1)["ids"][:6].tolist() == [1, 2, 3, 4, 5, 6]
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, cache_size=2)
+    for conversation_id in (1, 2):
+        index(service, conversation_id, ["chat"])
+    service._get_index(1)
+    index(service, 3, ["chien"])
+
+    assert list(service.indexes) == [1, 3]
+    # L'index évincé reste lisible depuis le disque
+    assert service._get_index(2)["count"] == 1
+    assert list(service.indexes) == [3, 2]
+
+
+def test_forget_removes_index(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch)
+    index(service, 1, ["chat"])
+    service._forget_sync(1)
+
+    assert 1 not in service.indexes
+    assert not any(path.exists() for path in service._paths(1))
+    assert service._search_sync(1, "chat", [1], k=1) == []
+
+
+@pytest.mark.asyncio
+async def test_build_context_recalls_relevant_turns_in_order(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, enabled=True, top_k=2)
+    service.model = object()
+    contents = ["chien", "chat", "oiseau", "chat", "chien", "chat", "oiseau", "chien"]
+    history = [FakeMessage(i + 1, content) for i, content in enumerate(contents)]
+    index(service, 1, contents)
+
+    selected, omitted = await service.build_context(history, head=1, recent=3)
+
+    # Milieu = ids 2 à 5 ; le dernier message parle de "chien" : id 5 puis un autre rappel
+    assert [msg.id for msg in selected][:1] == [1]
+    assert [msg.id for msg in selected][-3:] == [6, 7, 8]
+    recalled = [msg.id for msg in selected][1:-3]
+    assert 5 in recalled and len(recalled) == 2
+    assert recalled == sorted(recalled)
+    assert omitted == 2
+
+
+@pytest.mark.asyncio
+async def test_build_context_without_model_keeps_head_and_recent(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, enabled=True)
+    history = [FakeMessage(i + 1, "chat") for i in range(10)]
+
+    selected, omitted = await service.build_context(history, head=2, recent=6)
+
+    assert [msg.id for msg in selected] == [1, 2, 5, 6, 7, 8, 9, 10]
+    assert omitted == 2
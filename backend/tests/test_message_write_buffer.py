@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+
+import pytest
+
+from models import Message
+from services.history_service import HistoryService
+from services.message_write_buffer import MessageWriteBuffer
+import services.history_service as history_module
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSessionFactory:
+    """Simule AsyncSessionLocal : réserve des ids et enregistre chaque INSERT groupé."""
+
+    def __init__(self):
+        self.sequence = itertools.count(1)
+        self.inserts = []
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, factory):
+        self.factory = factory
+        self.rows = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if "nextval" in str(statement):
+            # Ordre volontairement inversé : le tampon ne doit pas en dépendre
+            ids = [next(self.factory.sequence) for _ in range(params["n"])]
+            return FakeResult([(message_id,) for message_id in reversed(ids)])
+        self.rows = statement.compile().params
+        return FakeResult([])
+
+    async def commit(self):
+        self.factory.inserts.append(self.rows)
+
+
+def make_buffer(factory, interval_ms=5, max_rows=64):
+    buffer = MessageWriteBuffer(session_factory=factory)
+    buffer.enabled = True
+    buffer.flush_interval_ms = interval_ms
+    buffer.max_rows = max_rows
+    return buffer
+
+
+def message(conversation_id, content):
+    return Message(conversation_id=conversation_id, sender="user", content=content)
+
+
+@pytest.mark.asyncio
+async def test_batches_by_max_rows():
+    factory = FakeSessionFactory()
+    buffer = make_buffer(factory, interval_ms=10_000, max_rows=4)
+    await buffer.start()
+
+    saved = await asyncio.wait_for(
+        asyncio.gather(*(buffer.submit(message(1, f"m{i}")) for i in range(8))),
+        timeout=2
+    )
+    await buffer.stop()
+
+    assert buffer.flushes == 2
+    assert len(factory.inserts) == 2
+    assert [msg.id for msg in saved] == list(range(1, 9))
+
+
+@pytest.mark.asyncio
+async def test_keeps_order_within_conversation():
+    factory = FakeSessionFactory()
+    buffer = make_buffer(factory, interval_ms=1, max_rows=3)
+    await buffer.start()
+
+    messages = [message(i % 2, f"m{i}") for i in range(10)]
+    saved = await asyncio.gather(*(buffer.submit(msg) for msg in messages))
+    await buffer.stop()
+
+    for conversation_id in (0, 1):
+        ids = [msg.id for msg in saved if msg.conversation_id == conversation_id]
+        contents = [msg.content for msg in saved if msg.conversation_id == conversation_id]
+        assert ids == sorted(ids)
+        assert contents == [msg.content for msg in messages if msg.conversation_id == conversation_id]
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending_messages():
+    factory = FakeSessionFactory()
+    buffer = make_buffer(factory, interval_ms=60_000, max_rows=100)
+    await buffer.start()
+
+    tasks = [asyncio.ensure_future(buffer.submit(message(1, f"m{i}"))) for i in range(5)]
+    await asyncio.sleep(0)
+    await asyncio.wait_for(buffer.stop(), timeout=2)
+
+    assert all(task.done() for task in tasks)
+    assert buffer.rows_written == 5
+    assert not buffer.accepting()
+
+
+class DirectSession:
+    def __init__(self):
+        self.added = []
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        obj.id = 42
+
+
+@pytest.mark.asyncio
+async def test_add_message_commits_directly_while_closing(monkeypatch):
+    buffer = make_buffer(FakeSessionFactory(), interval_ms=60_000)
+    await buffer.start()
+    buffer.closing = True
+    monkeypatch.setattr(history_module, "message_write_buffer", buffer)
+
+    session = DirectSession()
+    saved = await HistoryService(session).add_message(1, "user", "Bonjour")
+
+    assert saved.id == 42
+    assert session.added == [saved]
+    buffer.closing = False
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_single_message_flushes_after_interval():
+    factory = FakeSessionFactory()
+    buffer = make_buffer(factory, interval_ms=5, max_rows=64)
+    await buffer.start()
+    # Laisser l'écrivain se mettre en attente sur une file vide
+    await asyncio.sleep(0.01)
+
+    saved = await asyncio.wait_for(buffer.submit(message(1, "seul")), timeout=2)
+    assert saved.id == 1
+    assert buffer.flushes == 1
+    assert not buffer.pending
+
+    await buffer.stop()
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.suggestion_service import SuggestionService
+
+
+class FakeChatService:
+    """Backend LLM factice : chaque appel de suggestions dure `delay` secondes."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.in_flight = {}
+        self.calls = []
+        self.cancelled = []
+
+    async def generate_suggestions(self, exchanges):
+        self.calls.append([exchange["id"] for exchange in exchanges])
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append([exchange["id"] for exchange in exchanges])
+            raise
+        return {exchange["id"]: [f"Suite {exchange['id']} ?"] for exchange in exchanges}
+
+
+class FakeMessage:
+    def __init__(self, message_id, content="Réponse"):
+        self.id = message_id
+        self.timestamp = datetime(2026, 1, 1)
+        self.content = content
+
+
+def make_service(chat_service, saved, **settings):
+    service = SuggestionService(chat_service=chat_service)
+    service.enabled = True
+    service.idle_ms = 10
+    for name, value in settings.items():
+        setattr(service, name, value)
+
+    async def save(batch, suggestions):
+        saved.append(sorted(suggestions))
+
+    service._save = save
+    return service
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_event_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_batch_respects_token_budget():
+    chat_service = FakeChatService()
+    saved = []
+    service = make_service(chat_service, saved, batch_size=8, max_tokens=10)
+    await service.start()
+    for message_id in range(1, 5):
+        # 6 tokens par échange : deux échanges dépasseraient le budget de 10
+        service.enqueue(FakeMessage(message_id, "un deux trois"), "quatre cinq six")
+    try:
+        await wait_until(lambda: len(saved) == 4)
+    finally:
+        await service.stop()
+
+    assert chat_service.calls == [[1], [2], [3], [4]]
+
+
+@pytest.mark.asyncio
+async def test_chat_request_preempts_batch_and_requeues_it():
+    chat_service = FakeChatService(delay=0.3)
+    saved = []
+    service = make_service(chat_service, saved, batch_size=2)
+    await service.start()
+    for message_id in (1, 2, 3):
+        service.enqueue(FakeMessage(message_id), "Question")
+    try:
+        await wait_until(lambda: chat_service.calls)
+        # Une requête de chat démarre pendant le lot
+        chat_service.in_flight["model"] = 1
+        await wait_until(lambda: chat_service.cancelled)
+        assert service.preempted == 1
+        assert [exchange["id"] for exchange in service.pending] == [1, 2, 3]
+
+        chat_service.in_flight["model"] = 0
+        await wait_until(lambda: len(saved) == 2)
+    finally:
+        await service.stop()
+
+    assert chat_service.cancelled == [[1, 2]]
+    assert chat_service.calls == [[1, 2], [1, 2], [3]]
+    assert saved == [[1, 2], [3]]
+
+
+@pytest.mark.asyncio
+async def test_batch_over_time_budget_is_abandoned():
+    chat_service = FakeChatService(delay=1.0)
+    saved = []
+    service = make_service(chat_service, saved, timeout_s=0.1)
+    await service.start()
+    service.enqueue(FakeMessage(1), "Question")
+    try:
+        await wait_until(lambda: chat_service.cancelled)
+        await asyncio.sleep(0.05)
+    finally:
+        await service.stop()
+
+    assert saved == []
+    assert not service.pending
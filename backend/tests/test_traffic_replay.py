@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from middleware.traffic_capture import TrafficCaptureMiddleware, _llm_timing, llm_timer
+from replay_traffic import MESSAGES_ROUTE, Replayer, fit_latency_model, load_records, parse_server_timing
+
+
+def llm_record(context_tokens, response_tokens, llm_ms, wait_ms=0.0, status=200, overlap=0):
+    return {
+        "t": 0.0, "m": "POST", "p": MESSAGES_ROUTE, "s": status,
+        "l": llm_ms, "w": wait_ms, "ht": context_tokens, "rt": response_tokens, "o": overlap
+    }
+
+
+def test_parse_server_timing():
+    header = "app;dur=812.5, llm;dur=790.0, llm_wait;dur=12.3"
+    assert parse_server_timing(header) == {"app": 812.5, "llm": 790.0, "llm_wait": 12.3}
+    assert parse_server_timing(None) == {}
+    assert parse_server_timing("cache, app;dur=3") == {"app": 3.0}
+
+
+def test_fit_latency_model_recovers_coefficients():
+    # llm_ms = 200 + 0.5 * contexte + 25 * réponse, attente exclue du temps de service
+    records = [
+        llm_record(ht, rt, 200 + 0.5 * ht + 25 * rt + wait, wait_ms=wait)
+        for ht, rt, wait in [(10, 5, 0), (100, 20, 30), (400, 8, 0), (50, 40, 100), (250, 15, 5)]
+    ]
+    records.append({"t": 0.0, "m": "GET", "p": "/conversations/", "s": 200, "l": 0.0})
+    records.append(llm_record(100, 10, 99999, status=500))
+    # Appel concurrent : inclut l'attente dans la file d'Ollama, non mesurée
+    records.append(llm_record(100, 10, 5000, overlap=2))
+
+    model = fit_latency_model(records)
+
+    assert model["samples"] == 5
+    assert model["base_ms"] == pytest.approx(200, abs=1e-6)
+    assert model["prompt_token_ms"] == pytest.approx(0.5, abs=1e-6)
+    assert model["response_token_ms"] == pytest.approx(25, abs=1e-6)
+    assert model["noise_ms"] == pytest.approx(0, abs=1e-6)
+    assert model["response_tokens"] == [5, 20, 8, 40, 15]
+
+
+def test_fit_latency_model_needs_enough_samples():
+    with pytest.raises(ValueError):
+        fit_latency_model([llm_record(10, 5, 300), llm_record(20, 5, 310), llm_record(30, 5, 900, overlap=1)])
+
+
+@pytest.mark.asyncio
+async def test_llm_timer_counts_overlapping_calls():
+    async def call(start_s, duration_s):
+        timing = {"llm_ms": 0.0, "wait_ms": 0.0, "prompt_tokens": 0, "llm_overlap": 0}
+        _llm_timing.set(timing)
+        await asyncio.sleep(start_s)
+        with llm_timer(10):
+            await asyncio.sleep(duration_s)
+        return timing["llm_overlap"]
+
+    # A recouvre B (qui commence pendant A) ; C est isolé
+    overlaps = await asyncio.gather(call(0, 0.1), call(0.03, 0.03), call(0.2, 0.01))
+    assert overlaps == [1, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_middleware_keeps_repeated_headers(tmp_path):
+    app = FastAPI()
+
+    @app.get("/cookies")
+    async def cookies():
+        response = JSONResponse({"ok": True})
+        response.set_cookie("a", "1")
+        response.set_cookie("b", "2")
+        return response
+
+    capture_file = tmp_path / "capture.jsonl"
+    app.add_middleware(TrafficCaptureMiddleware, capture_file=str(capture_file))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/cookies")
+
+    assert response.json() == {"ok": True}
+    assert len(response.headers.get_list("set-cookie")) == 2
+    assert "app;dur=" in response.headers["server-timing"]
+    assert '"p":"/cookies"' in capture_file.read_text(encoding="utf-8")
+
+
+def conversation_app(created):
+    app = FastAPI()
+
+    @app.post("/conversations/")
+    async def create():
+        created.append(len(created) + 12)
+        return {"id": created[-1], "messages": []}
+
+    @app.post(MESSAGES_ROUTE)
+    async def send(conversation_id: int):
+        return {"content": f"Réponse pour {conversation_id}"}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_replay_reuses_captured_conversation(tmp_path):
+    capture_file = tmp_path / "capture.jsonl"
+    app = conversation_app([])
+    app.add_middleware(TrafficCaptureMiddleware, capture_file=str(capture_file))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        conversation_id = (await ac.post("/conversations/", json={"mode": "user_initiated"})).json()["id"]
+        for content in ("Bonjour", "Et ensuite ?"):
+            await ac.post(f"/conversations/{conversation_id}/messages", json={"content": content})
+
+    records = load_records(capture_file)
+    assert [record["c"] for record in records] == [12, 12, 12]
+
+    created = []
+    target = conversation_app(created)
+    async with AsyncClient(transport=ASGITransport(app=target), base_url="http://test") as ac:
+        replayer = Replayer(ac, records, speed=100)
+        await replayer.run()
+
+    assert created == [12]
+    assert [result["status"] for result in replayer.results] == [200, 200, 200]
@@ -87,6 +87,19 @@ function App() {
     setLoading(false)
   }
 
+  // Ouvrir une conversation : recharger ses messages (réhydrate une conversation archivée)
+  const selectConversation = async (conv: Conversation) => {
+    setCurrentConversation(conv)
+    try {
+      const response = await fetch(`${API_BASE}/conversations/${conv.id}`)
+      if (!response.ok) return
+      const fullConv = await response.json()
+      setCurrentConversation(current => current?.id === conv.id ? fullConv : current)
+    } catch (error) {
+      console.error('Erreur chargement conversation:', error)
+    }
+  }
+
   // Supprimer conversation
   const deleteConversation = async (id: number) => {
     if (!confirm('Supprimer cette conversation ?')) return
@@ -187,7 +200,7 @@ function App() {
               ) : (
                 <>
                   <div 
-                    onClick={() => setCurrentConversation(conv)}
+                    onClick={() => selectConversation(conv)}
                     className={`p-4 cursor-pointer transition-all rounded-lg mx-2 my-1 ${
                       currentConversation?.id === conv.id 
                         ? 'bg-gradient-to-r from-blue-600/20 to-purple-600/20 border-l-4 border-blue-500' 